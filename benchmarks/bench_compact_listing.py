@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Peak memory and time of listing views as full TSC.ViewItem objects vs compact records
+
+The views get parsed by tableauserverclient from generated REST API pages, so both listings pay
+the same XML parsing cost and differ only in what they keep.
+
+    python benchmarks/bench_compact_listing.py --count 100000
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+import tableauserverclient as TSC
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import tableau_wrapper
+
+
+NAMESPACE = {"t": "http://tableau.com/api"}
+VIEW_XML = ('<view id="{id:08d}-0000-4000-8000-{id:012d}" name="Sheet {sheet}" contentUrl="Workbook{workbook}/sheets/Sheet{sheet}" '
+            'createdAt="2024-01-01T00:00:00Z" updatedAt="2024-06-01T00:00:00Z" viewUrlName="Sheet{sheet}">'
+            '<workbook id="{workbook:08d}-0000-4000-8000-000000000000"/><owner id="owner-{owner}"/>'
+            '<project id="project-{project}" name="Project {project}"/><tags><tag label="finance"/></tags>'
+            '<usage totalViewCount="{id}"/></view>')
+
+
+def fake_views_endpoint(count):
+    """Endpoint serving count views in pages the way server.views.get does"""
+    def get(req_options):
+        first = (req_options.pagenumber - 1) * req_options.pagesize
+        views = "".join(VIEW_XML.format(id=index, sheet=index % 30, workbook=index // 30, owner=index % 200, project=index % 50)
+                for index in range(first, min(first + req_options.pagesize, count)))
+        response = ('<tsResponse xmlns="http://tableau.com/api"><pagination pageNumber="{}" pageSize="{}" totalAvailable="{}"/>'
+                    '<views>{}</views></tsResponse>').format(req_options.pagenumber, req_options.pagesize, count, views).encode("utf-8")
+        return (TSC.ViewItem.from_response(response, NAMESPACE), TSC.PaginationItem.from_response(response, NAMESPACE))
+    return (get)
+
+
+def list_full(count):
+    return (list(TSC.Pager(fake_views_endpoint(count))))
+
+
+def list_compact(count):
+    return (list(tableau_wrapper.iter_resources(fake_views_endpoint(count), tableau_wrapper.PICK_FIELDS["view"] + ("owner_id",))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--count", type=int, default=100000, help="number of views (set to 100000 by default)")
+    args = parser.parse_args()
+    for listing in (list_full, list_compact):
+        # time without tracemalloc, it slows down allocations a lot
+        gc.collect()
+        start = time.perf_counter()
+        resources = listing(args.count)
+        elapsed = time.perf_counter() - start
+        del resources
+        gc.collect()
+        tracemalloc.start()
+        resources = listing(args.count)
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del resources
+        print("{0:<13} {1:>7} items  {2:>7.1f} MB peak  {3:>7.1f} MB retained  {4:>6.2f}s".format(
+            listing.__name__, args.count, peak / 1e6, retained / 1e6, elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,451 @@
+#!/usr/bin/env python3
+
+import aiohttp
+import asyncio
+import contextlib
+import os
+import random
+import xml.sax.saxutils
+
+
+# REST API version used to ask the server for its version
+SERVER_INFO_VERSION = "2.4"
+# size of the chunks files get uploaded in
+UPLOAD_CHUNK_SIZE = 5 * 1024 * 1024
+# size of the chunks downloads get written in
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+# how often a request gets retried if the server is overloaded (429/503)
+REQUEST_MAX_RETRIES = 5
+# seconds to wait before the first retry, doubled with every further retry
+REQUEST_BACKOFF = 1
+# number of resources per page when looking up resources by name
+LOOKUP_PAGE_SIZE = 1000
+# characters the server can't take in a filter value, not even URL encoded
+FILTER_UNSAFE_CHARACTERS = (",", ":", "&")
+
+
+class AuthError(Exception):
+    """Authentication with the server failed"""
+
+
+class AsyncServer(object):
+    """
+    Signed in connection to the REST API of a server, shared by all the operations on an event loop
+
+    Requests that fail because the token expired sign in again once and get retried, requests
+    the server rejects as overloaded (429/503) get retried with backoff.
+    """
+
+    def __init__(self, server_url, username, password, site="", max_connections=100):
+        self.server_url = server_url.rstrip("/")
+        self.username = username
+        self.password = password
+        self.site = site
+        self.session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=max_connections))
+        self.auth_lock = asyncio.Lock()
+        self.version = None
+        self.token = None
+        self.site_id = None
+
+    async def __aenter__(self):
+        return (self)
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def url(self, path):
+        """URL of a path relative to the site, absolute paths (starting with '/') are relative to the API version"""
+        if path.startswith("/"):
+            return ("{}/api/{}{}".format(self.server_url, self.version, path))
+        return ("{}/api/{}/sites/{}/{}".format(self.server_url, self.version, self.site_id, path))
+
+    async def sign_in(self):
+        """Sign in with the credentials, use the newest API version of the server"""
+        if self.version is None:
+            async with self.session.get("{}/api/{}/serverinfo".format(self.server_url, SERVER_INFO_VERSION),
+                    headers={"Accept": "application/json"}) as response:
+                response.raise_for_status()
+                self.version = (await response.json())["serverInfo"]["restApiVersion"]
+        credentials = {"credentials": {"name": self.username, "password": self.password, "site": {"contentUrl": self.site}}}
+        async with self.session.post(self.url("/auth/signin"), json=credentials,
+                headers={"Accept": "application/json"}) as response:
+            if response.status != 200:
+                raise AuthError("Authentication failed")
+            credentials = (await response.json())["credentials"]
+        self.token = credentials["token"]
+        self.site_id = credentials["site"]["id"]
+
+    async def reauthenticate(self, expired_token):
+        """Sign in again unless another operation already replaced the expired token"""
+        async with self.auth_lock:
+            if self.token == expired_token:
+                await self.sign_in()
+
+    async def close(self):
+        """Sign out and close the connections"""
+        try:
+            if self.token is not None:
+                async with self.session.post(self.url("/auth/signout"), headers={"X-Tableau-Auth": self.token}):
+                    pass
+        finally:
+            self.token = None
+            await self.session.close()
+
+    @contextlib.asynccontextmanager
+    async def request(self, method, path, data=None, **kwargs):
+        """
+        Send a request with the auth token and yield the response
+
+        Parameters:
+        method          -- HTTP method - REQ
+        path            -- path relative to the site (or to the API version if starting with '/') - REQ
+        data            -- body, or a function creating it for every attempt (for bodies that can only be sent once) - OPT
+        """
+
+        headers = {"Accept": "application/json", **kwargs.pop("headers", {})}
+        reauthenticated = False
+        retries = 0
+        while True:
+            token = self.token
+            body = data() if callable(data) else data
+            async with self.session.request(method, self.url(path), data=body,
+                    headers={"X-Tableau-Auth": token, **headers}, **kwargs) as response:
+                # the token expired, sign in again and retry once
+                if response.status == 401 and not reauthenticated:
+                    reauthenticated = True
+                    await self.reauthenticate(token)
+                    continue
+                # the server is overloaded, retry once it asks to or with exponential backoff
+                if response.status in (429, 503) and retries < REQUEST_MAX_RETRIES:
+                    delay = get_retry_delay(response.headers.get("Retry-After"), retries)
+                    retries += 1
+                else:
+                    response.raise_for_status()
+                    yield (response)
+                    return
+            await asyncio.sleep(delay)
+
+    async def request_json(self, method, path, data=None, **kwargs):
+        """Send a request and return the JSON response"""
+        async with self.request(method, path, data=data, **kwargs) as response:
+            return (await response.json())
+
+
+async def publish(resource_type, project_name, path, mode, server_url=None, username=None, password=None, server=None):
+    """
+    Publish a datasource or workbook
+
+    Parameters:
+    resource_type   -- workbook or datasource - REQUIRED
+    project_name    -- name of the project the resource is stored in - REQUIRED
+    path            -- path of the resource to publish - REQUIRED
+    mode            -- 'CreateNew'/'Overwrite'/'Append'
+    server_url      -- the url of the server to connect with
+    username        -- username of the user to authenticate with
+    password        -- password of the user to authenticate with
+    server          -- the AsyncServer object if authenticated previosly
+
+    Return value(s):
+    resource_id     -- ID of the published workbook
+
+    Exception(s):
+    NameError       -- if resource_type is neither workbook nor datasource
+    NameError       -- invalid mode
+    """
+
+    if resource_type not in ("workbook", "datasource"):
+        raise NameError("Invalid resource_type")
+    if mode not in ("CreateNew", "Overwrite", "Append") or (mode == "Append" and resource_type == "workbook"):
+        raise NameError("Invalid mode '{}'".format(mode))
+    async with check_credentials_authenticate(username, password, server_url, server) as server:
+        # get project_id
+        project_id = await get_project_id(project_name, server)
+        # upload the file in chunks
+        upload = await server.request_json("POST", "fileUploads")
+        upload_id = upload["fileUpload"]["uploadSessionId"]
+        with open(path, "rb") as resource_file:
+            while True:
+                chunk = await asyncio.to_thread(resource_file.read, UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                await server.request_json("PUT", "fileUploads/{}".format(upload_id),
+                        data=lambda: multipart_payload("", ("tableau_file", chunk)))
+        # commit the upload as workbook or datasource
+        name, extension = os.path.splitext(os.path.basename(path))
+        payload = '<tsRequest><{0} name={1}><project id={2}/></{0}></tsRequest>'.format(
+                resource_type, xml.sax.saxutils.quoteattr(name), xml.sax.saxutils.quoteattr(project_id))
+        params = {"uploadSessionId": upload_id, "{}Type".format(resource_type): extension.lstrip(".")}
+        if mode == "Overwrite":
+            params["overwrite"] = "true"
+        elif mode == "Append":
+            params["append"] = "true"
+        if resource_type == "workbook":
+            params["asJob"] = "false"
+        new_resource = await server.request_json("POST", "{}s".format(resource_type), params=params,
+                data=lambda: multipart_payload(payload))
+    return (new_resource[resource_type]["id"])
+
+
+async def refresh(resource_type, resource_name, project_name, server_url=None, username=None, password=None, server=None):
+    """
+    Refresh a workbook or datasource
+
+    Parameters:
+    resource_type   -- workbook or datasource - REQUIRED
+    resource_name   -- name of the resource to refresh - REQUIRED
+    project_name    -- name of the project the resource is stored in - REQUIRED
+    server_url      -- the url of the server to connect with
+    username        -- username of the user to authenticate with
+    password        -- password of the user to authenticate with
+    server          -- the AsyncServer object if authenticated previosly
+
+    Return value(s):
+    resource_id     -- ID of the refreshed workbook
+
+    Exception(s):
+    NameError       -- if resource_type is neither workbook nor datasource
+    """
+
+    if resource_type not in ("workbook", "datasource"):
+        raise NameError("Invalid resource_type")
+    async with check_credentials_authenticate(username, password, server_url, server) as server:
+        # get id
+        resource_id, _ = await get_resource_id(resource_type, resource_name, project_name, server)
+        # start the refresh job
+        await server.request_json("POST", "{}s/{}/refresh".format(resource_type, resource_id), json={})
+    return (resource_id)
+
+
+async def download(resource_type, resource_name, project_name, server_url=None, username=None, password=None, path=None, server=None, include_extract=True):
+    """
+    Download the datasource or workbook
+
+    Parameters:
+    resource_type   -- workbook or datasource - REQUIRED
+    resource_name   -- name of the resource to download - REQUIRED
+    project_name    -- name of the project the resource is stored in - REQUIRED
+    path            -- path (file or directory) of the resource to download to (current working directory by default)
+    server_url      -- the url of the server to connect with
+    username        -- username of the user to authenticate with
+    password        -- password of the user to authenticate with
+    server          -- the AsyncServer object if authenticated previosly
+    include_extract -- boolean if extract should be included in the download, by default True
+
+    Return value(s):
+    file_path       -- path of the downloaded file
+
+    Exception(s):
+    NameError       -- if resource_type is neither workbook nor datasource
+    """
+
+    if resource_type not in ("workbook", "datasource"):
+        raise NameError("Invalid resource_type")
+    async with check_credentials_authenticate(username, password, server_url, server) as server:
+        # get id
+        resource_id, _ = await get_resource_id(resource_type, resource_name, project_name, server)
+        params = {"includeExtract": "true" if include_extract else "false"}
+        async with server.request("GET", "{}s/{}/content".format(resource_type, resource_id), params=params) as response:
+            # name the file like the server does if no file path is given
+            file_path = path or os.getcwd()
+            if os.path.isdir(file_path):
+                file_path = os.path.join(file_path, get_download_filename(response, resource_type, resource_name))
+            # stream to disk
+            with open(file_path, "wb") as resource_file:
+                async for chunk in response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    await asyncio.to_thread(resource_file.write, chunk)
+    return (file_path)
+
+
+@contextlib.asynccontextmanager
+async def check_credentials_authenticate(username=None, password=None, server_url=None, server=None):
+    """
+    Authenticates with credentials if server object None
+
+    Used as 'async with', a server object created here gets signed out and closed afterwards.
+
+    Parameters:
+    username        -- username of the user to authenticate with - SEMI-OPTIONAL (either server or username, password and server_url)
+    password        -- password of the user to authenticate with - SEMI-OPTIONAL (either server or username, password and server_url)
+    server_url      -- the url of the server to connect with - SEMI-OPTIONAL (either server or username, password and server_url)
+    server          -- the AsyncServer object if authenticated previosly - SEMI-OPTIONAL (either server or username, password and server_url)
+
+    Return value(s):
+    server          -- AsyncServer object
+
+    Exception(s):
+    TypeError       -- credentials are missing (either the server object or username, password and server_url)
+    """
+
+    # if a server object got passed in it is shared, leave it open
+    if server is not None:
+        yield (server)
+        return
+    if server_url is None or username is None or password is None:
+        raise TypeError
+    async with await authenticate(server_url, username, password) as server:
+        yield (server)
+
+
+async def authenticate(server_url, username, password, site="", max_connections=100):
+    """
+    Authenticate with credentials
+
+    Parameters:
+    server_url      -- the url of the server to connect with - REQ
+    username        -- username of the user to authenticate with - REQ
+    password        -- password of the user to authenticate with - REQ
+    site            -- content url of the site (default: the default site) - OPT
+    max_connections -- maximum number of open connections to the server (default: 100) - OPT
+
+    Return value(s):
+    server          -- AsyncServer object, share it between the operations and close it at the end
+
+    Exception(s):
+    AuthError       -- authentication failed
+    """
+
+    server = AsyncServer(server_url, username, password, site=site, max_connections=max_connections)
+    try:
+        await server.sign_in()
+    except Exception:
+        await server.close()
+        raise AuthError("Authentication failed")
+    return (server)
+
+
+async def get_project_id(project_name, server):
+    """
+    Get the ID of a project
+
+    Parameters:
+    project_name    -- name of the project the resource is stored in - REQUIRED
+    server          -- the AsyncServer object - REQUIRED
+
+    Return value(s):
+    project_id      -- ID of the resource
+
+    Exception(s):
+    NameError       -- invalid project_name
+    """
+
+    # make request
+    filtered_result = await get_resources_by_name("project", project_name, server)
+    if not filtered_result:
+        raise NameError("Invalid project_name '{}'".format(project_name))
+    # return the last object in the list (if there are multiple)
+    return (filtered_result.pop()["id"])
+
+
+async def get_resource_id(resource_type, resource_name, project_name, server):
+    """
+    Get the ID of a workbook, datasource or view
+
+    Parameters:
+    resource_type   -- type of the resource ('workbook'/'datasource'/'view') - REQUIRED
+    resource_name   -- name of the resource - REQUIRED
+    project_name    -- name of the project the resource is stored in - REQUIRED
+    server          -- the AsyncServer object - REQUIRED
+
+    Return value(s):
+    resource_id     -- ID of the resource
+    resource_object -- dict of the resource as returned by the server
+
+    Exception(s):
+    NameError       -- if resource_type is neither workbook, datasource nor view
+    NameError       -- invalid project_name or invalid resource_name
+    """
+
+    if resource_type not in ("workbook", "datasource", "view"):
+        raise NameError("Invalid resource_type")
+    # make request
+    filtered_result = await get_resources_by_name(resource_type, resource_name, server)
+    if not filtered_result:
+        raise NameError("No {} with the name '{}' on the server".format(resource_type, resource_name))
+    if resource_type == "view":
+        result = filtered_result.pop()
+        return (result["id"], result)
+    for result in filtered_result:
+        if result["project"]["name"] == project_name:
+            return (result["id"], result)
+    raise NameError("No project with the name '{}' on the server".format(project_name))
+
+
+async def get_resources_by_name(resource_type, name, server):
+    """
+    Get the resources of a type with a name
+
+    The name is filtered on by the server unless it contains characters the server can't take in a filter
+    value, then all the resources get listed and matched by name here.
+
+    Parameters:
+    resource_type   -- type of the resources ('project'/'workbook'/'datasource'/'view') - REQ
+    name            -- name of the resources - REQ
+    server          -- the AsyncServer object - REQ
+
+    Return value(s):
+    resources       -- list of dicts of the resources as returned by the server
+    """
+
+    params = {"pageSize": LOOKUP_PAGE_SIZE}
+    if not any(character in name for character in FILTER_UNSAFE_CHARACTERS):
+        params["filter"] = "name:eq:{}".format(name)
+    resources = []
+    page_number = 1
+    while True:
+        result = await server.request_json("GET", "{}s".format(resource_type), params=dict(params, pageNumber=page_number))
+        resources.extend(resource for resource in result["{}s".format(resource_type)].get(resource_type, [])
+                if resource["name"] == name)
+        if page_number * LOOKUP_PAGE_SIZE >= int(result["pagination"]["totalAvailable"]):
+            return (resources)
+        page_number += 1
+
+
+def get_retry_delay(retry_after, retries):
+    """
+    Seconds to wait before retrying a request the server rejected as overloaded
+
+    Parameters:
+    retry_after     -- value of the Retry-After header, None if the server didn't send one - REQ
+    retries         -- number of retries so far - REQ
+
+    Return value(s):
+    delay           -- seconds to wait
+    """
+
+    # only the delay-seconds form, an HTTP date falls back to the backoff
+    if retry_after is not None and retry_after.strip().isdigit():
+        return (int(retry_after))
+    # full jitter so the retries of concurrent operations spread out
+    return (random.uniform(0, REQUEST_BACKOFF * 2 ** retries))
+
+
+def get_download_filename(response, resource_type, resource_name):
+    """Name of a downloaded file as given by the server, the resource name if the server didn't give one"""
+    filename = response.content_disposition.filename if response.content_disposition else None
+    if filename:
+        # never let the server pick a directory
+        return (os.path.basename(filename))
+    packaged = response.content_type != "application/xml"
+    extension = {"workbook": (".twb", ".twbx"), "datasource": (".tds", ".tdsx")}[resource_type][packaged]
+    return (os.path.basename(resource_name) + extension)
+
+
+def multipart_payload(request_payload, file_part=None):
+    """
+    Build the multipart/mixed body the publish endpoints expect
+
+    Parameters:
+    request_payload -- XML request payload - REQ
+    file_part       -- (part name, bytes) of the file content - OPT
+
+    Return value(s):
+    writer          -- aiohttp MultipartWriter
+    """
+
+    writer = aiohttp.MultipartWriter("mixed")
+    part = writer.append(request_payload, {"Content-Type": "text/xml"})
+    part.set_content_disposition("form-data", name="request_payload")
+    if file_part is not None:
+        part = writer.append(file_part[1], {"Content-Type": "application/octet-stream"})
+        part.set_content_disposition("form-data", name=file_part[0], filename="file")
+    return (writer)
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+
+import concurrent.futures
+import copy
+import http.server
+import random
+import re
+import requests.adapters
+import threading
+import time
+import urllib.parse
+import xml.sax.saxutils
+import zlib
+
+import tableau_wrapper
+
+
+# REST API version the mock server reports
+MOCK_API_VERSION = "3.4"
+
+
+def render_view(server, view, request):
+    """
+    Render a view as image or PDF like download_view_image/download_view_pdf, without writing it to disk
+
+    Parameters:
+    server          -- the server object - REQ
+    view            -- the view object - REQ
+    request         -- dict with 'format' ('image'/'pdf', default: 'image'), 'filters' (key -> value),
+                       'resolution' and 'orientation' - REQ
+
+    Return value(s):
+    size            -- number of bytes rendered
+
+    Exception(s):
+    NameError       -- invalid format
+    """
+
+    # every render populates its own copy, the lazy image/pdf of a shared view would get overwritten
+    view = copy.copy(view)
+    if request.get("format", "image") == "image":
+        server.views.populate_image(view, tableau_wrapper.get_image_request_options(request.get("resolution", "high"), request.get("filters")))
+        return (len(view.image))
+    if request["format"] == "pdf":
+        server.views.populate_pdf(view, tableau_wrapper.get_pdf_request_options(request.get("orientation", "portrait"), request.get("filters")))
+        return (len(view.pdf))
+    raise NameError("Invalid format '{}'".format(request["format"]))
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of sorted values, None if there are none"""
+    if not sorted_values:
+        return (None)
+    return (sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))])
+
+
+def summarize_samples(samples, elapsed):
+    """
+    Summarize render samples
+
+    Parameters:
+    samples         -- list of (completed offset, latency, ok) - REQ
+    elapsed         -- seconds the samples are spread over - REQ
+
+    Return value(s):
+    summary         -- dict with requests, errors, error_rate, throughput (successful renders per second) and p50/p95/p99 latency
+    """
+
+    latencies = sorted(latency for _, latency, ok in samples if ok)
+    errors = sum(1 for _, _, ok in samples if not ok)
+    return ({"requests": len(samples), "errors": errors, "error_rate": errors / len(samples) if samples else 0.0,
+            "throughput": len(latencies) / elapsed if elapsed else 0.0, "p50": percentile(latencies, 0.5),
+            "p95": percentile(latencies, 0.95), "p99": percentile(latencies, 0.99)})
+
+
+def run_loadtest(server, mix, rps=None, concurrency=None, duration=60, report_interval=10, max_workers=256, seed=None):
+    """
+    Render a weighted mix of views at a target rate or concurrency and measure the latency
+
+    With rps the requests get started on a fixed schedule no matter how long the previous ones take
+    (open loop) and the latency is measured from the scheduled start, so a slow server can't hide
+    queueing delay. With concurrency every worker starts its next render once the previous finished.
+    The connection pool of the server's session gets sized to the render threads, so no render waits
+    for a new (TLS) connection of the client.
+
+    Parameters:
+    server          -- the server object - REQ
+    mix             -- list of dicts with 'view' (name), 'weight' (default: 1) and the render_view options - REQ
+    rps             -- target renders per second - SEMI-OPTIONAL (either rps or concurrency)
+    concurrency     -- number of renders running at the same time - SEMI-OPTIONAL (either rps or concurrency)
+    duration        -- seconds to run (default: 60) - OPT
+    report_interval -- seconds per interval of the report over time (default: 10) - OPT
+    max_workers     -- maximum number of renders in flight in open loop mode (default: 256) - OPT
+    seed            -- seed of the random choice of the views (default: random) - OPT
+
+    Return value(s):
+    report          -- summary of the whole run plus 'intervals', the summaries over time
+
+    Exception(s):
+    TypeError       -- neither or both of rps and concurrency are set
+    ValueError      -- rps or concurrency is not positive
+    """
+
+    if (rps is None) == (concurrency is None):
+        raise TypeError("Either rps or concurrency is required")
+    if (rps if rps is not None else concurrency) <= 0:
+        raise ValueError("rps and concurrency have to be positive")
+    # keep a pooled connection for every render thread
+    adapter = requests.adapters.HTTPAdapter(pool_maxsize=max_workers if rps is not None else concurrency)
+    server.session.mount("http://", adapter)
+    server.session.mount("https://", adapter)
+    # resolve every view once up front
+    views = {}
+    for request in mix:
+        if request["view"] not in views:
+            _, views[request["view"]] = tableau_wrapper.get_resource_id("view", request["view"], project_name=None, server=server)
+    weights = [request.get("weight", 1) for request in mix]
+    rng = random.Random(seed)
+    rng_lock = threading.Lock()
+    samples = []
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def render(scheduled):
+        with rng_lock:
+            request = rng.choices(mix, weights)[0]
+        try:
+            render_view(server, views[request["view"]], request)
+            ok = True
+        except Exception:
+            ok = False
+        completed = time.perf_counter()
+        samples.append((completed - start, completed - scheduled, ok))
+
+    def closed_loop():
+        while time.perf_counter() < deadline:
+            render(time.perf_counter())
+
+    if rps is not None:
+        # open loop: start the renders on schedule, waiting renders count towards the latency
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for index in range(int(duration * rps)):
+                scheduled = start + index / rps
+                time.sleep(max(0.0, scheduled - time.perf_counter()))
+                executor.submit(render, scheduled)
+    else:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for _ in range(concurrency):
+                executor.submit(closed_loop)
+    elapsed = time.perf_counter() - start
+    # summarize the whole run and every interval by completion time
+    report = summarize_samples(samples, elapsed)
+    report["intervals"] = []
+    for interval_start in range(0, int(elapsed) + 1, report_interval):
+        interval_samples = [sample for sample in samples if interval_start <= sample[0] < interval_start + report_interval]
+        if interval_samples:
+            # the last interval ends with the run
+            interval = summarize_samples(interval_samples, min(report_interval, elapsed - interval_start))
+            interval["start"] = interval_start
+            report["intervals"].append(interval)
+    return (report)
+
+
+def run_mock_server(port=8000, latency=0.05, error_rate=0.0):
+    """
+    Serve a minimal fake of the REST endpoints the load test uses, for offline testing
+
+    Every credential signs in, every view name resolves to a view and renders take latency seconds.
+
+    Parameters:
+    port            -- port to listen on (default: 8000) - OPT
+    latency         -- seconds every render takes (default: 0.05) - OPT
+    error_rate      -- fraction of renders failing with HTTP 500 (default: 0.0) - OPT
+    """
+
+    get_mock_server(port, latency, error_rate).serve_forever()
+
+
+def get_mock_server(port=8000, latency=0.05, error_rate=0.0):
+    """
+    Create the mock server run_mock_server serves, without serving it yet
+
+    Parameters:
+    port            -- port to listen on, 0 for any free port (default: 8000) - OPT
+    latency         -- seconds every render takes (default: 0.05) - OPT
+    error_rate      -- fraction of renders failing with HTTP 500 (default: 0.0) - OPT
+
+    Return value(s):
+    mock_server     -- http.server.ThreadingHTTPServer
+    """
+
+    api = "/api/{}".format(MOCK_API_VERSION)
+
+    class MockHandler(http.server.BaseHTTPRequestHandler):
+        def respond(self, status, body=b"", content_type="application/xml"):
+            if isinstance(body, str):
+                body = '<?xml version="1.0" encoding="UTF-8"?><tsResponse xmlns="http://tableau.com/api">{}</tsResponse>'.format(body).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            path, _, query = self.path.partition("?")
+            if path.lower().endswith("/serverinfo"):
+                self.respond(200, '<serverInfo><productVersion build="mock">mock</productVersion>'
+                        '<restApiVersion>{}</restApiVersion></serverInfo>'.format(MOCK_API_VERSION))
+            elif re.fullmatch(api + "/sites/[^/]+/views", path):
+                # the view is named after the name filter, its ID is derived from the name
+                name = urllib.parse.unquote_plus(re.search("name:eq:([^&,]*)", query).group(1)) if "name:eq:" in query else "mock"
+                self.respond(200, '<pagination pageNumber="1" pageSize="100" totalAvailable="1"/><views>'
+                        '<view id="{0}" name={1} contentUrl="mock/sheets/{0}"/></views>'.format(
+                        zlib.crc32(name.encode("utf-8")), xml.sax.saxutils.quoteattr(name)))
+            elif re.fullmatch(api + "/sites/[^/]+/views/[^/]+/(image|pdf)", path):
+                time.sleep(latency)
+                if random.random() < error_rate:
+                    self.respond(500, "<error code=\"500000\"><summary>Mock error</summary></error>")
+                elif path.endswith("/image"):
+                    self.respond(200, b"\x89PNG mock", "image/png")
+                else:
+                    self.respond(200, b"%PDF-1.4 mock", "application/pdf")
+            else:
+                self.respond(404, "<error code=\"404000\"><summary>Not found</summary></error>")
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path == api + "/auth/signin":
+                self.respond(200, '<credentials token="mock"><site id="mock" contentUrl=""/><user id="mock"/></credentials>')
+            elif self.path == api + "/auth/signout":
+                self.respond(204)
+            else:
+                self.respond(404, "<error code=\"404000\"><summary>Not found</summary></error>")
+
+        def log_message(self, format, *args):
+            pass
+
+    return (http.server.ThreadingHTTPServer(("localhost", port), MockHandler))
@@ -2,12 +2,85 @@
 
 import tableauserverclient as TSC
 from getpass import getpass
+import concurrent.futures
+import contextlib
+import csv
+import datetime
+import heapq
+import json
 import os
+import re
+import shutil
+import struct
+import sys
+import tempfile
 import time
+import urllib.parse
+import xml.sax.saxutils
+import zipfile
+import zlib
 import argparse
 import pick
 
 
+# local cache of the datasource -> workbook dependency graph
+LINEAGE_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".tableau-cli", "lineage.json")
+# seconds after which the cached dependency graph gets rebuilt
+LINEAGE_MAX_AGE = 24 * 60 * 60
+# Metadata API queries the dependency graph is built from, paginated with $first/$after
+LINEAGE_DATASOURCES_QUERY = """
+query datasources($first: Int, $after: String) {
+  publishedDatasourcesConnection(first: $first, after: $after) {
+    nodes { luid name projectName hasExtracts }
+    pageInfo { hasNextPage endCursor }
+  }
+}
+"""
+LINEAGE_WORKBOOKS_QUERY = """
+query workbooks($first: Int, $after: String) {
+  workbooksConnection(first: $first, after: $after) {
+    nodes {
+      luid name projectName
+      upstreamDatasources { luid name projectName hasExtracts }
+      embeddedDatasources { hasExtracts }
+    }
+    pageInfo { hasNextPage endCursor }
+  }
+}
+"""
+# local persisted queue of the refresh scheduler
+REFRESH_QUEUE_PATH = os.path.join(os.path.expanduser("~"), ".tableau-cli", "refresh-queue.json")
+# how often the scheduler retries a refresh that failed to start
+REFRESH_MAX_RETRIES = 3
+# local high-water marks of the delta publishes
+WATERMARK_PATH = os.path.join(os.path.expanduser("~"), ".tableau-cli", "watermarks.json")
+# hyper types a CSV column can get, from the narrowest on, with the pattern its values have to match
+CSV_COLUMN_TYPES = {
+    "big_int": (re.compile(r"-?(0|[1-9][0-9]*)"), int),
+    "double": (re.compile(r"-?(0|[1-9][0-9]*)(\.[0-9]+)?([eE][-+]?[0-9]+)?"), float),
+    "date": (re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}"), datetime.date.fromisoformat),
+    "timestamp": (re.compile(r"[0-9]{4}-[0-9]{2}-[0-9]{2}[T ][0-9]{2}:[0-9]{2}:[0-9]{2}(\.[0-9]{3}|\.[0-9]{6})?"), datetime.datetime.fromisoformat),
+}
+# size of the chunks archive members get streamed in
+PACKAGE_CHUNK_SIZE = 1024 * 1024
+# sizes and offsets from this limit on need the zip64 extension
+ZIP64_LIMIT = 0xFFFFFFFF
+# value of the classic size and offset fields that points to the zip64 extra field
+ZIP64_SENTINEL = 0xFFFFFFFF
+# archive members that stand alone, only these get dropped if the document doesn't name them
+# (anything else, e.g. the .dbf/.shx/.prj of a shapefile, can be needed without being named)
+PACKAGE_DROPPABLE_EXTENSIONS = (".hyper", ".tde", ".png", ".jpg", ".jpeg", ".gif", ".bmp", ".svg")
+# fields the CLI needs to let the user pick a resource, by resource type
+PICK_FIELDS = {
+    "workbook": ("id", "name", "project_name"),
+    "datasource": ("id", "name", "project_name"),
+    "view": ("id", "name", "project_id"),
+    "project": ("id", "name"),
+}
+# compact record types, one per selection of fields
+COMPACT_RECORD_TYPES = {}
+
+
 def publish(resource_type, project_name, path, mode, server_url=None, username=None, password=None, server=None):
     """
     Publish a datasource or workbook
@@ -31,7 +104,7 @@ def publish(resource_type, project_name, path, mode, server_url=None, username=N
     """
 
     # check if the either all the necessary credentials or the server object are there and authenticate if necessary
-    server = check_credentials_authenticate(username, password, server)
+    server = check_credentials_authenticate(username, password, server_url, server)
     # get project_id
     project_id = get_project_id(project_name, server)
     # if resource is a datasource create new object and publish
@@ -53,6 +126,573 @@ def publish(resource_type, project_name, path, mode, server_url=None, username=N
     return (new_resource.id)
 
 
+@contextlib.contextmanager
+def lock_state_file(path, blocking=True):
+    """
+    Hold an exclusive lock on a state file of the CLI so overlapping cron jobs don't lose updates
+
+    Parameters:
+    path            -- path of the state file, the lock is taken on '<path>.lock' - REQ
+    blocking        -- wait for the lock, else fail right away if it is held (default: True) - OPT
+
+    Exception(s):
+    BlockingIOError -- blocking is False and the lock is held
+    """
+
+    # fcntl only exists on POSIX, importing it here keeps the rest of the module usable on Windows
+    import fcntl
+
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path + ".lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def load_watermarks(watermark_path=WATERMARK_PATH):
+    """
+    Read the high-water marks and extract schemas of the previous delta publishes from disk
+
+    Parameters:
+    watermark_path  -- path of the watermark file (default: ~/.tableau-cli/watermarks.json) - OPT
+
+    Return value(s):
+    watermarks      -- dict of 'server_address|site|project_name/datasource_name' -> dict with the last published
+                       'watermark' and the 'columns' and 'column_types' of the extract
+    """
+
+    if not os.path.isfile(watermark_path):
+        return ({})
+    with open(watermark_path) as watermark_file:
+        return (json.load(watermark_file))
+
+
+def save_watermarks(watermarks, watermark_path=WATERMARK_PATH):
+    """
+    Write the high-water marks to disk, replacing the old file only once the new one is complete
+
+    Parameters:
+    watermarks      -- dict of 'server_address|site|project_name/datasource_name' -> watermark and extract schema - REQ
+    watermark_path  -- path of the watermark file (default: ~/.tableau-cli/watermarks.json) - OPT
+    """
+
+    os.makedirs(os.path.dirname(os.path.abspath(watermark_path)), exist_ok=True)
+    with open(watermark_path + ".tmp", "w") as watermark_file:
+        json.dump(watermarks, watermark_file)
+    os.replace(watermark_path + ".tmp", watermark_path)
+
+
+def parse_csv_value(value, column_type):
+    """
+    Convert a CSV value to the hyper type of its column
+
+    Parameters:
+    value           -- the value as read from the file - REQ
+    column_type     -- hyper type of the column ('big_int'/'double'/'date'/'timestamp'/'text') - REQ
+
+    Return value(s):
+    value           -- the converted value, None for an empty value
+
+    Exception(s):
+    ValueError      -- the value doesn't fit the type of the column
+    """
+
+    if value == "":
+        return (None)
+    if column_type == "text":
+        return (value)
+    if column_type not in CSV_COLUMN_TYPES:
+        raise ValueError("Invalid column type '{}' for a CSV file".format(column_type))
+    pattern, convert = CSV_COLUMN_TYPES[column_type]
+    if not pattern.fullmatch(value):
+        raise ValueError("'{}' is no {} value".format(value, column_type))
+    return (convert(value))
+
+
+def get_csv_column_types(data_path):
+    """
+    Infer the hyper type of every column of a CSV file from all its rows
+
+    A column gets the narrowest type all its values fit without losing anything (so '007' stays text),
+    and 'text' if it has no values at all.
+
+    Parameters:
+    data_path       -- path of the CSV file (with header row) - REQ
+
+    Return value(s):
+    column_types    -- hyper type of every column ('big_int'/'double'/'date'/'timestamp'/'text')
+    """
+
+    with open(data_path, newline="") as data_file:
+        reader = csv.reader(data_file)
+        # types every column still fits, None until the column had a value
+        candidates = [None] * len(next(reader))
+        for row in reader:
+            for index, value in enumerate(row[:len(candidates)]):
+                if value == "":
+                    continue
+                if candidates[index] is None:
+                    candidates[index] = list(CSV_COLUMN_TYPES)
+                candidates[index] = [column_type for column_type in candidates[index] if fits_csv_column_type(value, column_type)]
+    return ([column_types[0] if column_types else "text" for column_types in candidates])
+
+
+def fits_csv_column_type(value, column_type):
+    """Check whether a CSV value converts to the hyper type without losing anything"""
+    try:
+        parse_csv_value(value, column_type)
+        return (True)
+    except ValueError:
+        return (False)
+
+
+def scan_delta_csv(data_path, watermark_column, watermark, schema=None):
+    """
+    Find the rows of a CSV file newer than the watermark without loading the file into memory
+
+    Parameters:
+    data_path       -- path of the CSV file (with header row) - REQ
+    watermark_column -- name of the high-water-mark column - REQ
+    watermark       -- last published watermark value, None for all rows - REQ
+    schema          -- columns and column types of the earlier delta publishes, None to infer them from the file - OPT
+
+    Return value(s):
+    columns         -- names of the columns
+    column_types    -- hyper type of every column ('big_int'/'double'/'date'/'timestamp'/'text')
+    row_count       -- number of new rows
+    new_watermark   -- highest watermark value of the new rows
+
+    Exception(s):
+    NameError       -- watermark_column is not in the file
+    ValueError      -- the columns don't match the schema, a value doesn't fit the type of its column
+                       or the watermark value of a row is empty
+    """
+
+    with open(data_path, newline="") as data_file:
+        columns = next(csv.reader(data_file))
+    if watermark_column not in columns:
+        raise NameError("Invalid watermark_column '{}'".format(watermark_column))
+    if schema is None:
+        column_types = get_csv_column_types(data_path)
+    elif columns != schema[0]:
+        raise ValueError("The columns of '{}' don't match the columns of the earlier delta publishes ({})".format(
+            data_path, ", ".join(schema[0])))
+    else:
+        column_types = schema[1]
+    # convert every new row once up front so a bad value fails before anything gets published
+    watermark_index = columns.index(watermark_column)
+    row_count = 0
+    new_watermark = None
+    for row in iter_delta_csv(data_path, watermark_column, watermark, column_types):
+        row_count += 1
+        if new_watermark is None or row[watermark_index] > new_watermark:
+            new_watermark = row[watermark_index]
+    # dates and timestamps are kept as ISO strings in the watermark file
+    if hasattr(new_watermark, "isoformat"):
+        new_watermark = new_watermark.isoformat()
+    if new_watermark is None:
+        new_watermark = watermark
+    return (columns, column_types, row_count, new_watermark)
+
+
+def iter_delta_csv(data_path, watermark_column, watermark, column_types):
+    """
+    Yield the rows of a CSV file newer than the watermark, converted to the hyper types of the columns
+
+    Exception(s):
+    ValueError      -- a value doesn't fit the type of its column or the watermark value of a row is empty
+    """
+
+    with open(data_path, newline="") as data_file:
+        reader = csv.reader(data_file)
+        watermark_index = next(reader).index(watermark_column)
+        watermark_type = column_types[watermark_index]
+        if watermark is not None:
+            try:
+                watermark = parse_csv_value(str(watermark), watermark_type)
+            except ValueError as error:
+                raise ValueError("Invalid watermark for the column '{}': {}".format(watermark_column, error)) from None
+        for row in reader:
+            try:
+                if len(row) != len(column_types):
+                    raise ValueError("{} values instead of {}".format(len(row), len(column_types)))
+                value = parse_csv_value(row[watermark_index], watermark_type)
+                if value is None:
+                    raise ValueError("Empty value in the watermark column '{}'".format(watermark_column))
+                if watermark is not None and not value > watermark:
+                    continue
+                row = [parse_csv_value(value, column_type) for value, column_type in zip(row, column_types)]
+            except ValueError as error:
+                raise ValueError("Line {} of '{}': {}".format(reader.line_num, data_path, error)) from None
+            yield (row)
+
+
+def scan_delta_parquet(data_path, watermark_column, watermark, schema=None):
+    """
+    Find the rows of a Parquet file newer than the watermark, reading only the watermark column
+
+    Parameters:
+    data_path       -- path of the Parquet file - REQ
+    watermark_column -- name of the high-water-mark column - REQ
+    watermark       -- last published watermark value, None for all rows - REQ
+    schema          -- columns and column types of the earlier delta publishes, None for the first publish - OPT
+
+    Return value(s):
+    columns         -- names of the columns
+    column_types    -- hyper type of every column ('big_int'/'double'/'bool'/'date'/'timestamp'/'text')
+    row_count       -- number of new rows
+    new_watermark   -- highest watermark value of the new rows
+
+    Exception(s):
+    NameError       -- watermark_column is not in the file
+    ValueError      -- the columns or their types don't match the schema or the watermark value of a row is empty
+    """
+
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    parquet_file = pq.ParquetFile(data_path)
+    arrow_schema = parquet_file.schema_arrow
+    if watermark_column not in arrow_schema.names:
+        raise NameError("Invalid watermark_column '{}'".format(watermark_column))
+    column_types = [get_parquet_column_type(field.type) for field in arrow_schema]
+    if schema is not None and [arrow_schema.names, column_types] != [list(schema[0]), list(schema[1])]:
+        raise ValueError("The columns of '{}' don't match the columns of the earlier delta publishes ({})".format(
+            data_path, ", ".join("{} {}".format(*column) for column in zip(*schema))))
+    row_count = 0
+    new_watermark = None
+    for batch in parquet_file.iter_batches(columns=[watermark_column]):
+        if batch.column(0).null_count:
+            raise ValueError("Empty value in the watermark column '{}' of '{}'".format(watermark_column, data_path))
+        values = filter_delta_batch(batch, watermark_column, watermark).column(0)
+        row_count += len(values)
+        batch_max = pc.max(values).as_py()
+        if batch_max is not None and (new_watermark is None or batch_max > new_watermark):
+            new_watermark = batch_max
+    # dates and timestamps are kept as ISO strings in the watermark file
+    if hasattr(new_watermark, "isoformat"):
+        new_watermark = new_watermark.isoformat()
+    if new_watermark is None:
+        new_watermark = watermark
+    return (arrow_schema.names, column_types, row_count, new_watermark)
+
+
+def iter_delta_parquet(data_path, watermark_column, watermark, column_types):
+    """Yield the rows of a Parquet file newer than the watermark, one batch in memory at a time"""
+    import pyarrow.parquet as pq
+
+    for batch in pq.ParquetFile(data_path).iter_batches():
+        columns = filter_delta_batch(batch, watermark_column, watermark).to_pydict()
+        for row in zip(*columns.values()):
+            yield ([str(value) if column_type == "text" and value is not None else value for value, column_type in zip(row, column_types)])
+
+
+def get_parquet_column_type(arrow_type):
+    """Map an Arrow type to the hyper type the column gets in the extract"""
+    import pyarrow as pa
+
+    if pa.types.is_boolean(arrow_type):
+        return ("bool")
+    if pa.types.is_integer(arrow_type):
+        return ("big_int")
+    if pa.types.is_floating(arrow_type):
+        return ("double")
+    if pa.types.is_date(arrow_type):
+        return ("date")
+    if pa.types.is_timestamp(arrow_type):
+        return ("timestamp")
+    return ("text")
+
+
+def filter_delta_batch(batch, watermark_column, watermark):
+    """Keep the rows of an Arrow record batch whose watermark column is greater than the watermark"""
+    import pyarrow as pa
+    import pyarrow.compute as pc
+
+    if watermark is None:
+        return (batch)
+    values = batch.column(batch.schema.get_field_index(watermark_column))
+    return (batch.filter(pc.greater(values, pa.scalar(watermark).cast(values.type))))
+
+
+def write_extract(extract_path, columns, column_types, rows):
+    """
+    Package rows as a single table hyper extract
+
+    Parameters:
+    extract_path    -- path of the .hyper file to create - REQ
+    columns         -- names of the columns - REQ
+    column_types    -- hyper type of every column ('big_int'/'double'/'bool'/'date'/'timestamp'/'text') - REQ
+    rows            -- iterable of rows - REQ
+    """
+
+    from tableauhyperapi import Connection, CreateMode, HyperProcess, Inserter, SqlType, TableDefinition, TableName, Telemetry
+
+    table = TableDefinition(TableName("Extract", "Extract"),
+            [TableDefinition.Column(column, getattr(SqlType, column_type)()) for column, column_type in zip(columns, column_types)])
+    with HyperProcess(telemetry=Telemetry.DO_NOT_SEND_USAGE_DATA_TO_TABLEAU) as hyper:
+        with Connection(hyper.endpoint, extract_path, CreateMode.CREATE_AND_REPLACE) as connection:
+            connection.catalog.create_schema(table.table_name.schema_name)
+            connection.catalog.create_table(table)
+            with Inserter(connection, table) as inserter:
+                inserter.add_rows(rows)
+                inserter.execute()
+
+
+def find_unreferenced_members(archive_path):
+    """
+    Find the extracts and images of a .twbx/.tdsx archive the workbook or datasource doesn't reference
+
+    The document is searched chunk by chunk for the file names, nothing gets extracted to disk.
+    Only members with one of the PACKAGE_DROPPABLE_EXTENSIONS can be unreferenced, other files
+    (e.g. the sidecar files of a shapefile) may be needed without the document naming them.
+
+    Parameters:
+    archive_path    -- path of the .twbx/.tdsx file - REQ
+
+    Return value(s):
+    unreferenced    -- list of the names of the unreferenced members
+
+    Exception(s):
+    NameError       -- there is no .twb/.tds document in the archive
+    """
+
+    with zipfile.ZipFile(archive_path) as archive:
+        names = [info.filename for info in archive.infolist() if not info.is_dir()]
+        documents = [name for name in names if "/" not in name and name.endswith((".twb", ".tds"))]
+        if not documents:
+            raise NameError("No .twb/.tds document in '{}'".format(archive_path))
+        # the spellings a file name can have in the XML
+        patterns = {}
+        for name in names:
+            if name in documents or not name.lower().endswith(PACKAGE_DROPPABLE_EXTENSIONS):
+                continue
+            basename = name.rsplit("/", 1)[-1]
+            spellings = {basename, xml.sax.saxutils.escape(basename, {"'": "&apos;", '"': "&quot;"}), urllib.parse.quote(basename)}
+            patterns[name] = [spelling.encode("utf-8") for spelling in spellings]
+        overlap = max([len(spelling) for spellings in patterns.values() for spelling in spellings] or [1]) - 1
+        # search the documents, keeping the end of the previous chunk for names crossing chunk boundaries
+        referenced = set()
+        for document in documents:
+            with archive.open(document) as document_file:
+                tail = b""
+                for chunk in iter(lambda: document_file.read(PACKAGE_CHUNK_SIZE), b""):
+                    window = tail + chunk
+                    for name, spellings in patterns.items():
+                        if name not in referenced and any(spelling in window for spelling in spellings):
+                            referenced.add(name)
+                    tail = window[-overlap:] if overlap else b""
+    return ([name for name in patterns if name not in referenced])
+
+
+def deflate_member(archive_path, name, compresslevel):
+    """
+    Deflate one archive member into a temporary file
+
+    Parameters:
+    archive_path    -- path of the archive - REQ
+    name            -- name of the member - REQ
+    compresslevel   -- zlib compression level (0-9) - REQ
+
+    Return value(s):
+    member          -- dict with name, date_time, external_attr, crc, file_size, compress_size and data_file
+    """
+
+    # every worker opens its own handle, zip file objects can't be shared between threads
+    with zipfile.ZipFile(archive_path) as archive:
+        info = archive.getinfo(name)
+        data_file = tempfile.TemporaryFile()
+        compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS)
+        crc = 0
+        with archive.open(info) as member_file:
+            for chunk in iter(lambda: member_file.read(PACKAGE_CHUNK_SIZE), b""):
+                crc = zlib.crc32(chunk, crc)
+                data_file.write(compressor.compress(chunk))
+        data_file.write(compressor.flush())
+    return ({"name": name, "date_time": info.date_time, "external_attr": info.external_attr, "crc": crc,
+            "file_size": info.file_size, "compress_size": data_file.tell(), "data_file": data_file})
+
+
+def write_zip_member(output_file, member):
+    """
+    Write a deflated member to a zip archive
+
+    Parameters:
+    output_file     -- file object of the archive - REQ
+    member          -- deflated member as returned by deflate_member - REQ
+
+    Return value(s):
+    record          -- central directory record of the member
+    """
+
+    offset = output_file.tell()
+    name = member["name"].encode("utf-8")
+    year, month, day, hour, minute, second = member["date_time"]
+    dos_time = hour << 11 | minute << 5 | second // 2
+    dos_date = (year - 1980) << 9 | month << 5 | day
+    # local header, sizes over 4GB go into the zip64 extra field
+    zip64 = max(member["file_size"], member["compress_size"]) >= ZIP64_LIMIT
+    if zip64:
+        extra = struct.pack("<HHQQ", 1, 16, member["file_size"], member["compress_size"])
+        sizes = (ZIP64_SENTINEL, ZIP64_SENTINEL)
+    else:
+        extra = b""
+        sizes = (member["compress_size"], member["file_size"])
+    version = 45 if zip64 else 20
+    output_file.write(struct.pack("<4sHHHHHLLLHH", b"PK\x03\x04", version, 0x800, zipfile.ZIP_DEFLATED,
+            dos_time, dos_date, member["crc"], sizes[0], sizes[1], len(name), len(extra)))
+    output_file.write(name + extra)
+    member["data_file"].seek(0)
+    shutil.copyfileobj(member["data_file"], output_file, PACKAGE_CHUNK_SIZE)
+    # central directory record, the offset can need zip64 as well
+    if zip64 or offset >= ZIP64_LIMIT:
+        extra = struct.pack("<HHQQQ", 1, 24, member["file_size"], member["compress_size"], offset)
+        sizes, offset, version = (ZIP64_SENTINEL, ZIP64_SENTINEL), ZIP64_SENTINEL, 45
+    record = struct.pack("<4sHHHHHHLLLHHHHHLL", b"PK\x01\x02", version, version, 0x800, zipfile.ZIP_DEFLATED,
+            dos_time, dos_date, member["crc"], sizes[0], sizes[1], len(name), len(extra), 0, 0, 0,
+            member["external_attr"], offset)
+    return (record + name + extra)
+
+
+def write_zip_end(output_file, records):
+    """
+    Write the central directory and the end records of a zip archive
+
+    Parameters:
+    output_file     -- file object of the archive - REQ
+    records         -- central directory records of the members - REQ
+    """
+
+    directory_offset = output_file.tell()
+    for record in records:
+        output_file.write(record)
+    directory_size = output_file.tell() - directory_offset
+    # zip64 end record and locator if the counts or offsets don't fit the classic end record
+    if len(records) >= 0xFFFF or directory_offset >= ZIP64_LIMIT or directory_size >= ZIP64_LIMIT:
+        zip64_offset = output_file.tell()
+        output_file.write(struct.pack("<4sQHHLLQQQQ", b"PK\x06\x06", 44, 45, 45, 0, 0,
+                len(records), len(records), directory_size, directory_offset))
+        output_file.write(struct.pack("<4sLQL", b"PK\x06\x07", 0, zip64_offset, 1))
+        # the classic fields that don't fit point to the zip64 end record
+        directory_size = directory_size if directory_size < ZIP64_LIMIT else ZIP64_SENTINEL
+        directory_offset = directory_offset if directory_offset < ZIP64_LIMIT else ZIP64_SENTINEL
+    output_file.write(struct.pack("<4sHHHHLLH", b"PK\x05\x06", 0, 0, min(len(records), 0xFFFF),
+            min(len(records), 0xFFFF), directory_size, directory_offset, 0))
+
+
+def slim_package(path, output_path, compresslevel=6, max_workers=None):
+    """
+    Drop the unreferenced extracts and images of a .twbx/.tdsx archive and recompress it
+
+    The members are streamed and recompressed in parallel, only the compressed members are
+    buffered in temporary files.
+
+    Parameters:
+    path            -- path of the .twbx/.tdsx file - REQ
+    output_path     -- path of the slimmed archive - REQ
+    compresslevel   -- zlib compression level (0-9, default: 6) - OPT
+    max_workers     -- number of members compressed at the same time (default: number of cores) - OPT
+
+    Return value(s):
+    report          -- dict with original_size, packaged_size, saved and dropped (names of the dropped members)
+
+    Exception(s):
+    NameError       -- path is neither a .twbx nor a .tdsx file
+    """
+
+    if not path.endswith((".twbx", ".tdsx")):
+        raise NameError("Invalid package '{}'".format(path))
+    dropped = find_unreferenced_members(path)
+    with zipfile.ZipFile(path) as archive:
+        names = [info.filename for info in archive.infolist() if not info.is_dir() and info.filename not in dropped]
+    records = []
+    with open(output_path, "wb") as output_file:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+            # members are written in the original order as soon as they are compressed
+            for member in executor.map(deflate_member, [path] * len(names), names, [compresslevel] * len(names)):
+                with member["data_file"]:
+                    records.append(write_zip_member(output_file, member))
+        write_zip_end(output_file, records)
+    original_size = os.path.getsize(path)
+    packaged_size = os.path.getsize(output_path)
+    return ({"original_size": original_size, "packaged_size": packaged_size,
+            "saved": original_size - packaged_size, "dropped": dropped})
+
+
+def publish_delta(data_path, watermark_column, datasource_name, project_name, server_url=None, username=None, password=None, server=None, initial_watermark=None, watermark_path=WATERMARK_PATH):
+    """
+    Append the rows of a local CSV/Parquet file added since the last successful delta publish to a datasource
+
+    The columns and their types are decided by the first delta publish and stored next to the watermark,
+    later publishes reuse them so Append always gets the same extract schema. Watermarks are kept per
+    server, site, project and datasource, so publishing a file to staging doesn't move the watermark of prod.
+    The first delta publish needs an initial_watermark, else every row of the file would get appended to
+    the rows the datasource already has.
+
+    Parameters:
+    data_path       -- path of the CSV or Parquet file - REQ
+    watermark_column -- name of the column that grows with every new row (e.g. ID or timestamp) - REQ
+    datasource_name -- name of the datasource to append to - REQ
+    project_name    -- name of the project the datasource is stored in - REQ
+    server_url      -- the url of the server to connect with
+    username        -- username of the user to authenticate with
+    password        -- password of the user to authenticate with
+    server          -- the server object if authenticated previosly
+    initial_watermark -- watermark to start from if nothing got published yet, e.g. the highest value in the
+                       datasource - SEMI-OPTIONAL (required for the first delta publish)
+    watermark_path  -- path of the watermark file (default: ~/.tableau-cli/watermarks.json) - OPT
+
+    Return value(s):
+    resource_id     -- ID of the datasource, None if there were no new rows
+    watermark       -- the watermark after the publish
+
+    Exception(s):
+    NameError       -- datasource_name is missing
+    NameError       -- if the file is neither CSV nor Parquet
+    NameError       -- watermark_column is not in the file
+    ValueError      -- the file doesn't match the schema of the earlier delta publishes or has an empty watermark value
+    ValueError      -- neither a watermark of an earlier delta publish nor initial_watermark
+    """
+
+    if not datasource_name:
+        raise NameError("Missing datasource_name")
+    if data_path.endswith(".csv"):
+        scan_delta, iter_delta = scan_delta_csv, iter_delta_csv
+    elif data_path.endswith(".parquet"):
+        scan_delta, iter_delta = scan_delta_parquet, iter_delta_parquet
+    else:
+        raise NameError("Invalid file type '{}'".format(data_path))
+    # check if the either all the necessary credentials or the server object are there and authenticate if necessary
+    server = check_credentials_authenticate(username, password, server_url, server)
+    # overlapping delta publishes would append the same rows twice, so they run one after the other
+    with lock_state_file(watermark_path):
+        # get the watermark and schema of the last publish
+        watermark_key = "{}|{}|{}/{}".format(server.server_address, server.site_url, project_name, datasource_name)
+        watermarks = load_watermarks(watermark_path)
+        if watermark_key not in watermarks and initial_watermark is None:
+            raise ValueError("No delta publish to '{}' yet, the initial watermark is required".format(watermark_key))
+        state = watermarks.get(watermark_key, {"watermark": initial_watermark})
+        schema = (state["columns"], state["column_types"]) if "columns" in state else None
+        # find the new rows
+        columns, column_types, row_count, new_watermark = scan_delta(data_path, watermark_column, state["watermark"], schema)
+        if row_count == 0:
+            return (None, state["watermark"])
+        project_id = get_project_id(project_name, server)
+        with tempfile.TemporaryDirectory() as extract_dir:
+            # package the new rows as extract
+            extract_path = os.path.join(extract_dir, datasource_name + ".hyper")
+            write_extract(extract_path, columns, column_types, iter_delta(data_path, watermark_column, state["watermark"], column_types))
+            # append the extract to the datasource
+            new_resource = TSC.DatasourceItem(project_id, name=datasource_name)
+            new_resource = server.datasources.publish(new_resource, extract_path, "Append")
+        # remember the watermark and schema only once the publish succeeded
+        watermarks[watermark_key] = {"watermark": new_watermark, "columns": columns, "column_types": column_types}
+        save_watermarks(watermarks, watermark_path)
+    return (new_resource.id, new_watermark)
+
+
 def refresh(resource_type, resource_name, project_name, server_url=None, username=None, password=None, server=None):
     """
     Refresh a workbook or datasource
@@ -74,14 +714,14 @@ def refresh(resource_type, resource_name, project_name, server_url=None, usernam
     """
 
     # check if the either all the necessary credentials or the server object are there and authenticate if necessary
-    server = check_credentials_authenticate(username, password, server)
+    server = check_credentials_authenticate(username, password, server_url, server)
     # get id
     resource_id, _ = get_resource_id(resource_type, resource_name, project_name, server)
     # if resource is a workbook get the id and refresh
     if resource_type == 'workbook':
         workbook = server.workbooks.refresh(resource_id)
     # if resource is a datasource get the id and refresh
-    elif resource_type == 'datasoure':
+    elif resource_type == 'datasource':
         workbook = server.datasources.refresh(resource_id)
     # raise error if resource_type id neither workbook nor datasource
     else:
@@ -89,6 +729,438 @@ def refresh(resource_type, resource_name, project_name, server_url=None, usernam
     return (resource_id)
 
 
+def refresh_by_id(resource_type, resource_id, server, wait=True):
+    """
+    Refresh a workbook or datasource by its ID
+
+    Parameters:
+    resource_type   -- workbook or datasource - REQ
+    resource_id     -- ID of the resource to refresh - REQ
+    server          -- the server object - REQ
+    wait            -- block until the refresh job on the server has finished (default: True) - OPT
+
+    Return value(s):
+    job             -- job object of the refresh
+
+    Exception(s):
+    NameError       -- if resource_type is neither workbook nor datasource
+    """
+
+    # start the refresh job
+    if resource_type == "workbook":
+        job = server.workbooks.refresh(resource_id)
+    elif resource_type == "datasource":
+        job = server.datasources.refresh(resource_id)
+    else:
+        raise NameError("Invalid resource_type '{}'".format(resource_type))
+    # (optional) wait until the extract is refreshed so dependent resources see the new data
+    if wait:
+        job = server.jobs.wait_for_job(job.id)
+    return (job)
+
+
+def query_metadata_nodes(server, query, connection, page_size=100):
+    """
+    Yield the nodes of a paginated Metadata API query
+
+    Parameters:
+    server          -- the server object - REQ
+    query           -- GraphQL query with $first/$after variables - REQ
+    connection      -- name of the queried connection (e.g. 'workbooksConnection') - REQ
+    page_size       -- nodes per request (default: 100) - OPT
+
+    Return value(s):
+    nodes           -- generator of the nodes as dicts
+
+    Exception(s):
+    RuntimeError    -- the Metadata API returned errors (e.g. it is disabled on the server)
+    """
+
+    after = None
+    while True:
+        result = server.metadata.query(query, variables={"first": page_size, "after": after})
+        if result.get("errors"):
+            raise RuntimeError("Metadata API query failed: {}".format(result["errors"]))
+        page = result["data"][connection]
+        for node in page["nodes"]:
+            yield (node)
+        if not page["pageInfo"]["hasNextPage"]:
+            return
+        after = page["pageInfo"]["endCursor"]
+
+
+def build_lineage_graph(server, cache_path=LINEAGE_CACHE_PATH):
+    """
+    Build the datasource -> workbook dependency graph from the Metadata API lineage and cache it locally
+
+    Parameters:
+    server          -- the server object - REQ
+    cache_path      -- path of the local cache file, None to skip caching (default: ~/.tableau-cli/lineage.json) - OPT
+
+    Return value(s):
+    graph           -- dict with 'created_at', 'nodes' (id -> type, name, project_name, has_extracts)
+                       and 'edges' (upstream id -> downstream ids)
+
+    Exception(s):
+    RuntimeError    -- the Metadata API returned errors (e.g. it is disabled on the server)
+    """
+
+    nodes = {}
+    edges = {}
+    # register all the published datasources, the luid is the ID the REST API uses
+    for datasource in query_metadata_nodes(server, LINEAGE_DATASOURCES_QUERY, "publishedDatasourcesConnection"):
+        nodes[datasource["luid"]] = {"type": "datasource", "name": datasource["name"], "project_name": datasource["projectName"],
+                "has_extracts": datasource["hasExtracts"]}
+    # register all the workbooks and link them to the published datasources they are built on,
+    # a workbook only has something to refresh if one of its own datasources is an extract
+    for workbook in query_metadata_nodes(server, LINEAGE_WORKBOOKS_QUERY, "workbooksConnection"):
+        nodes[workbook["luid"]] = {"type": "workbook", "name": workbook["name"], "project_name": workbook["projectName"],
+                "has_extracts": any(embedded["hasExtracts"] for embedded in workbook["embeddedDatasources"])}
+        for datasource in workbook["upstreamDatasources"]:
+            nodes.setdefault(datasource["luid"], {"type": "datasource", "name": datasource["name"], "project_name": datasource["projectName"],
+                    "has_extracts": datasource["hasExtracts"]})
+            downstream = edges.setdefault(datasource["luid"], [])
+            if workbook["luid"] not in downstream:
+                downstream.append(workbook["luid"])
+    graph = {"created_at": time.time(), "nodes": nodes, "edges": edges}
+    # write to disk
+    if cache_path:
+        os.makedirs(os.path.dirname(os.path.abspath(cache_path)), exist_ok=True)
+        with open(cache_path, "w") as cache_file:
+            json.dump(graph, cache_file)
+    return (graph)
+
+
+def get_lineage_graph(server, cache_path=LINEAGE_CACHE_PATH, rebuild=False, max_age=LINEAGE_MAX_AGE):
+    """
+    Get the dependency graph from the local cache, build it if there is no cache yet or it is too old
+
+    Parameters:
+    server          -- the server object - REQ
+    cache_path      -- path of the local cache file (default: ~/.tableau-cli/lineage.json) - OPT
+    rebuild         -- ignore the cache and rebuild the graph from the server (default: False) - OPT
+    max_age         -- seconds after which the cache gets rebuilt (default: 24 hours) - OPT
+
+    Return value(s):
+    graph           -- dict with 'created_at', 'nodes' (id -> type, name, project_name, has_extracts)
+                       and 'edges' (upstream id -> downstream ids)
+    """
+
+    if not rebuild and cache_path and os.path.isfile(cache_path):
+        with open(cache_path) as cache_file:
+            graph = json.load(cache_file)
+        if time.time() - graph.get("created_at", 0) <= max_age:
+            return (graph)
+    return (build_lineage_graph(server, cache_path))
+
+
+def get_downstream_resources(graph, root_id):
+    """
+    Get the root and every resource depending on it
+
+    Parameters:
+    graph           -- the dependency graph - REQ
+    root_id         -- ID of the resource the refresh starts from - REQ
+
+    Return value(s):
+    affected        -- dict of the affected IDs -> set of IDs of their affected upstream resources
+
+    Exception(s):
+    NameError       -- root_id is not in the graph
+    """
+
+    if root_id not in graph["nodes"]:
+        raise NameError("No resource with the ID '{}' in the lineage graph".format(root_id))
+    # walk the edges starting from the root
+    affected = {root_id: set()}
+    queue = [root_id]
+    while queue:
+        upstream_id = queue.pop()
+        for downstream_id in graph["edges"].get(upstream_id, []):
+            if downstream_id not in affected:
+                affected[downstream_id] = set()
+                queue.append(downstream_id)
+            affected[downstream_id].add(upstream_id)
+    return (affected)
+
+
+def refresh_downstream(resource_type, resource_name, project_name, server_url=None, username=None, password=None, server=None, max_workers=4, rebuild_lineage=False, cache_path=LINEAGE_CACHE_PATH, lineage_max_age=LINEAGE_MAX_AGE):
+    """
+    Refresh a workbook or datasource and everything depending on it in dependency order
+
+    Resources whose upstream resources are all refreshed get refreshed in parallel. If a refresh
+    fails, the resources depending on it are skipped. Resources without an extract of their own
+    (e.g. workbooks connecting live to a published extract) need no refresh.
+
+    Parameters:
+    resource_type   -- workbook or datasource - REQ
+    resource_name   -- name of the resource to start the refresh from - REQ
+    project_name    -- name of the project the resource is stored in - REQ
+    server_url      -- the url of the server to connect with
+    username        -- username of the user to authenticate with
+    password        -- password of the user to authenticate with
+    server          -- the server object if authenticated previosly
+    max_workers     -- maximum number of refreshes running at the same time (default: 4) - OPT
+    rebuild_lineage -- rebuild the cached dependency graph before refreshing (default: False) - OPT
+    cache_path      -- path of the local lineage cache file (default: ~/.tableau-cli/lineage.json) - OPT
+    lineage_max_age -- seconds after which the cached dependency graph gets rebuilt (default: 24 hours) - OPT
+
+    Return value(s):
+    results         -- dict of the affected IDs -> 'refreshed'/'failed'/'skipped'/'not_needed'
+
+    Exception(s):
+    NameError       -- if resource_type is neither workbook nor datasource
+    RuntimeError    -- the dependency graph contains a cycle
+    """
+
+    # check if the either all the necessary credentials or the server object are there and authenticate if necessary
+    server = check_credentials_authenticate(username, password, server_url, server)
+    # get id
+    root_id, _ = get_resource_id(resource_type, resource_name, project_name, server)
+    # get the graph, rebuild it if the root was published after the cache got written
+    graph = get_lineage_graph(server, cache_path, rebuild=rebuild_lineage, max_age=lineage_max_age)
+    if root_id not in graph["nodes"] and not rebuild_lineage:
+        graph = build_lineage_graph(server, cache_path)
+    pending = get_downstream_resources(graph, root_id)
+    results = {}
+    running = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            # start every resource whose upstream resources are all refreshed
+            ready = [resource_id for resource_id, upstream in pending.items() if not upstream]
+            while ready:
+                for resource_id in ready:
+                    del pending[resource_id]
+                    # nothing to refresh, the resources depending on it can go ahead right away
+                    if not graph["nodes"][resource_id].get("has_extracts", True):
+                        results[resource_id] = "not_needed"
+                        for upstream in pending.values():
+                            upstream.discard(resource_id)
+                        continue
+                    future = executor.submit(refresh_by_id, graph["nodes"][resource_id]["type"], resource_id, server)
+                    running[future] = resource_id
+                ready = [resource_id for resource_id, upstream in pending.items() if not upstream]
+            if not running:
+                if not pending:
+                    break
+                raise RuntimeError("Dependency cycle between {}".format(", ".join(pending)))
+            # wait for the next refresh to finish
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                resource_id = running.pop(future)
+                try:
+                    future.result()
+                    results[resource_id] = "refreshed"
+                except Exception:
+                    results[resource_id] = "failed"
+                    # skip everything depending on the failed resource
+                    for skipped_id in get_downstream_resources(graph, resource_id):
+                        if skipped_id in pending:
+                            del pending[skipped_id]
+                            results[skipped_id] = "skipped"
+                for upstream in pending.values():
+                    upstream.discard(resource_id)
+    return (results)
+
+
+def load_refresh_queue(queue_path=REFRESH_QUEUE_PATH):
+    """
+    Read the refresh queue from disk
+
+    Parameters:
+    queue_path      -- path of the queue file (default: ~/.tableau-cli/refresh-queue.json) - OPT
+
+    Return value(s):
+    queue           -- dict with 'queued' (heap of [priority, requested_at, resource_type, resource_id, retries])
+                       and 'running' (resource_id -> resource_type, job_id, priority, retries)
+    """
+
+    if not os.path.isfile(queue_path):
+        return ({"queued": [], "running": {}})
+    with open(queue_path) as queue_file:
+        return (json.load(queue_file))
+
+
+def save_refresh_queue(queue, queue_path=REFRESH_QUEUE_PATH):
+    """
+    Write the refresh queue to disk, replacing the old file only once the new one is complete
+
+    Parameters:
+    queue           -- the refresh queue - REQ
+    queue_path      -- path of the queue file (default: ~/.tableau-cli/refresh-queue.json) - OPT
+    """
+
+    with open(queue_path + ".tmp", "w") as queue_file:
+        json.dump(queue, queue_file)
+    os.replace(queue_path + ".tmp", queue_path)
+
+
+def enqueue_refresh(resource_type, resource_id, priority=5, queue_path=REFRESH_QUEUE_PATH):
+    """
+    Add a refresh request to the scheduler queue
+
+    Requests for a resource that is already queued or running get coalesced into the existing one,
+    a queued request only takes over the higher priority.
+
+    Parameters:
+    resource_type   -- workbook or datasource - REQ
+    resource_id     -- ID of the resource to refresh - REQ
+    priority        -- lower values get refreshed first (default: 5) - OPT
+    queue_path      -- path of the queue file (default: ~/.tableau-cli/refresh-queue.json) - OPT
+
+    Return value(s):
+    queued          -- False if the request got coalesced into an existing one
+
+    Exception(s):
+    NameError       -- if resource_type is neither workbook nor datasource
+    """
+
+    if resource_type not in ("workbook", "datasource"):
+        raise NameError("Invalid resource_type '{}'".format(resource_type))
+    with lock_state_file(queue_path):
+        queue = load_refresh_queue(queue_path)
+        # coalesce with a running refresh
+        if resource_id in queue["running"]:
+            return (False)
+        # coalesce with a queued refresh
+        for entry in queue["queued"]:
+            if entry[3] == resource_id:
+                if priority < entry[0]:
+                    entry[0] = priority
+                    heapq.heapify(queue["queued"])
+                    save_refresh_queue(queue, queue_path)
+                return (False)
+        heapq.heappush(queue["queued"], [priority, time.time(), resource_type, resource_id, 0])
+        save_refresh_queue(queue, queue_path)
+    return (True)
+
+
+def count_active_refresh_jobs(server):
+    """
+    Count the pending and running extract refresh jobs on the server, no matter who started them
+
+    Parameters:
+    server          -- the server object - REQ
+
+    Return value(s):
+    active          -- number of pending and running refresh jobs
+    """
+
+    active = 0
+    for status in (TSC.BackgroundJobItem.Status.Pending, TSC.BackgroundJobItem.Status.InProgress):
+        # only the total of the pagination is needed
+        options = TSC.RequestOptions(pagesize=1)
+        options.filter.add(TSC.Filter(TSC.RequestOptions.Field.JobType,
+                                        TSC.RequestOptions.Operator.Equals,
+                                        "refresh_extracts"))
+        options.filter.add(TSC.Filter(TSC.RequestOptions.Field.Status,
+                                        TSC.RequestOptions.Operator.Equals,
+                                        status))
+        _, pagination_item = server.jobs.get(req_options=options)
+        active += pagination_item.total_available
+    return (active)
+
+
+def run_refresh_scheduler(server, max_jobs=2, queue_path=REFRESH_QUEUE_PATH, poll_interval=10, watch=False, max_retries=REFRESH_MAX_RETRIES):
+    """
+    Work through the refresh queue without more than max_jobs refreshes running on the server at once
+
+    The budget counts every pending or running refresh job on the server, not only the ones started
+    here. The queue (including the IDs of the running jobs) is persisted after every change, so a
+    restarted scheduler picks up where the previous one stopped. The queue is only locked while it
+    is read and written, never during requests to the server, so enqueueing never waits on the network.
+    Only one scheduler works through a queue at a time, others started meanwhile return right away.
+
+    Parameters:
+    server          -- the server object - REQ
+    max_jobs        -- maximum number of refresh jobs running on the server at once (default: 2) - OPT
+    queue_path      -- path of the queue file (default: ~/.tableau-cli/refresh-queue.json) - OPT
+    poll_interval   -- seconds between two checks of the running jobs (default: 10) - OPT
+    watch           -- keep waiting for new requests once the queue is empty (default: False) - OPT
+    max_retries     -- how often a refresh that failed to start gets queued again (default: 3) - OPT
+
+    Return value(s):
+    results         -- dict of the refreshed IDs -> 'refreshed'/'failed', None if another scheduler works through the queue
+    """
+
+    # held for the whole run, so the refreshes another scheduler is starting are never taken for leftovers of a crash
+    with contextlib.ExitStack() as stack:
+        try:
+            stack.enter_context(lock_state_file(queue_path + ".scheduler", blocking=False))
+        except BlockingIOError:
+            return (None)
+        return (work_through_refresh_queue(server, max_jobs, queue_path, poll_interval, watch, max_retries))
+
+
+def work_through_refresh_queue(server, max_jobs, queue_path, poll_interval, watch, max_retries):
+    """Work through the refresh queue like run_refresh_scheduler, the caller has to hold the scheduler lock"""
+    results = {}
+    while True:
+        with lock_state_file(queue_path):
+            running = load_refresh_queue(queue_path)["running"]
+        # check the running jobs, a job that can't be checked (e.g. purged) counts as failed
+        finished = {}
+        for resource_id, entry in running.items():
+            if entry["job_id"] is None:
+                continue
+            try:
+                job = server.jobs.get_by_id(entry["job_id"])
+            except Exception:
+                finished[resource_id] = "failed"
+                continue
+            if job.completed_at is not None:
+                finished[resource_id] = "refreshed" if str(job.finish_code) == "0" else "failed"
+        # without knowing the load on the server no refresh gets started
+        try:
+            server_active = count_active_refresh_jobs(server)
+        except Exception:
+            server_active = None
+        with lock_state_file(queue_path):
+            queue = load_refresh_queue(queue_path)
+            for resource_id, status in finished.items():
+                if resource_id in queue["running"]:
+                    del queue["running"][resource_id]
+                    results[resource_id] = status
+            # refreshes a previous scheduler stopped before starting go back into the queue
+            for resource_id, entry in running.items():
+                if entry["job_id"] is None and resource_id in queue["running"]:
+                    del queue["running"][resource_id]
+                    heapq.heappush(queue["queued"], [entry["priority"], time.time(), entry["resource_type"], resource_id, entry["retries"]])
+            # take the queued refreshes with the highest priority while there is budget left
+            starting = []
+            if server_active is not None:
+                in_flight = max(len(queue["running"]), server_active)
+                while queue["queued"] and in_flight + len(starting) < max_jobs:
+                    priority, _, resource_type, resource_id, retries = heapq.heappop(queue["queued"])
+                    queue["running"][resource_id] = {"resource_type": resource_type, "job_id": None, "priority": priority, "retries": retries}
+                    starting.append(resource_id)
+            save_refresh_queue(queue, queue_path)
+        # start the refreshes
+        job_ids = {}
+        for resource_id in starting:
+            try:
+                job_ids[resource_id] = refresh_by_id(queue["running"][resource_id]["resource_type"], resource_id, server, wait=False).id
+            except Exception:
+                job_ids[resource_id] = None
+        with lock_state_file(queue_path):
+            queue = load_refresh_queue(queue_path)
+            for resource_id in starting:
+                entry = queue["running"][resource_id]
+                if job_ids[resource_id] is not None:
+                    entry["job_id"] = job_ids[resource_id]
+                    continue
+                # the refresh failed to start, retry it later
+                del queue["running"][resource_id]
+                if entry["retries"] < max_retries:
+                    heapq.heappush(queue["queued"], [entry["priority"], time.time(), entry["resource_type"], resource_id, entry["retries"] + 1])
+                else:
+                    results[resource_id] = "failed"
+            save_refresh_queue(queue, queue_path)
+        if not watch and not queue["queued"] and not queue["running"]:
+            return (results)
+        time.sleep(poll_interval)
+
+
 def download(resource_type, resource_name, project_name, server_url=None, username=None, password=None, path=None, server=None, include_extract=True):
     """
     Download the datasource or workbook
@@ -151,23 +1223,11 @@ def download_view_image(resource_name, server_url=None, username=None, password=
     """
 
     # check if the either all the necessary credentials or the server object are there and authenticate if necessary
-    server = check_credentials_authenticate(username, password, server)
+    server = check_credentials_authenticate(username, password, server_url, server)
     # get id
     resource_id, resource_object = get_resource_id("view", resource_name, project_name=None, server=server)
-    print(resource_id, resource_object)
-    # request for high resolution
-    if resolution == 'high':
-        imageresolution=TSC.ImageRequestOptions.Resolution.High
-    # request for medium resolution
-    elif resolution == 'medium':
-        imageresolution=TSC.ImageRequestOptions.Resolution.Medium
-    # request for low resolution
-    elif resolution == 'low':
-        imageresolution=TSC.ImageRequestOptions.Resolution.Low
-    else:
-        raise NameError("Invalid resolution '{}'".format(resolution))
     # make request
-    image_req_option = TSC.ImageRequestOptions(imageresolution)
+    image_req_option = get_image_request_options(resolution)
     server.views.populate_image(resource_object, image_req_option)
     # write to disk
     if path is None:
@@ -204,6 +1264,68 @@ def download_view_pdf(resource_name, project_name, server_url=None, username=Non
     server = check_credentials_authenticate(username, password, server_url, server)
     # get id and object
     resource_id, resource_object = get_resource_id("view", resource_name, project_name=None, server=server)
+    # set the PDF request options and (optional) a view filter
+    filters = {filter_key: filter_value} if filter_key and filter_value else None
+    pdf_req_option = get_pdf_request_options(orientation, filters)
+    # retrieve the PDF for a view
+    server.views.populate_pdf(resource_object, pdf_req_option)
+    # write to disk
+    file_path = path
+    if file_path is None:
+        file_path = os.getcwd() + "/" + resource_object.name + ".pdf"
+    with open(file_path, "wb") as pdf_file:
+        pdf_file.write(resource_object.pdf)
+    return (file_path)
+
+
+def get_image_request_options(resolution="high", filters=None):
+    """
+    Get the request options to render a view as image
+
+    Parameters:
+    resolution      -- resultion of image ('low'/'medium'/'high') - OPT
+    filters         -- dict of the keys and values the view gets filtered on - OPT
+
+    Return value(s):
+    image_req_option -- image request options
+
+    Exception(s):
+    NameError       -- if resolution is invalid
+    """
+
+    # request for high resolution
+    if resolution == 'high':
+        imageresolution=TSC.ImageRequestOptions.Resolution.High
+    # request for medium resolution
+    elif resolution == 'medium':
+        imageresolution=TSC.ImageRequestOptions.Resolution.Medium
+    # request for low resolution
+    elif resolution == 'low':
+        imageresolution=TSC.ImageRequestOptions.Resolution.Low
+    else:
+        raise NameError("Invalid resolution '{}'".format(resolution))
+    image_req_option = TSC.ImageRequestOptions(imageresolution)
+    # (optional) set view filters
+    for filter_key, filter_value in (filters or {}).items():
+        image_req_option.vf(filter_key, filter_value)
+    return (image_req_option)
+
+
+def get_pdf_request_options(orientation="portrait", filters=None):
+    """
+    Get the request options to render a view as A4 PDF
+
+    Parameters:
+    orientation     -- orientation of the PDF ('portrait'/'landscape') - OPT
+    filters         -- dict of the keys and values the view gets filtered on - OPT
+
+    Return value(s):
+    pdf_req_option  -- PDF request options
+
+    Exception(s):
+    NameError       -- Invalid orientation
+    """
+
     # set landscape orientation for the pdf
     if orientation == 'landscape':
         orientation_req = TSC.PDFRequestOptions.Orientation.Landscape
@@ -212,17 +1334,11 @@ def download_view_pdf(resource_name, project_name, server_url=None, username=Non
         orientation_req = TSC.PDFRequestOptions.Orientation.Portrait
     else:
         raise NameError("Invalid orientation '{}'".format(orientation))
-    # set the PDF request options
     pdf_req_option = TSC.PDFRequestOptions(page_type=TSC.PDFRequestOptions.PageType.A4, orientation=orientation_req)
-    # (optional) set a view filter
-    if filter_key and filter_value:
+    # (optional) set view filters
+    for filter_key, filter_value in (filters or {}).items():
         pdf_req_option.vf(filter_key, filter_value)
-    # retrieve the PDF for a view
-    server.views.populate_pdf(view_item, pdf_req_option)
-    file_path = server.workbooks.download(
-                resource_id, path, include_extract=extract,
-                no_extract=None)
-    return (file_path)
+    return (pdf_req_option)
 
 
 def download_view_csv():
@@ -311,12 +1427,12 @@ def get_project_id(project_name, server):
 
 def get_resource_id(resource_type, resource_name, project_name, server):
     """
-    Get the ID of a workbook or view
+    Get the ID of a workbook, datasource, view or project
 
     Parameters:
-    resource_type   -- type of the resource ('workbook'/'view') - REQUIRED
+    resource_type   -- type of the resource ('workbook'/'datasource'/'view'/'project') - REQUIRED
     resource_name   -- name of the resource - REQUIRED
-    project_name    -- name of the project the resource is stored in - REQUIRED
+    project_name    -- name of the project the resource is stored in (ignored for views and projects) - REQUIRED
     server          -- the server object - REQUIRED
 
     Return value(s):
@@ -324,7 +1440,7 @@ def get_resource_id(resource_type, resource_name, project_name, server):
     resource_object -- object
 
     Exception(s):
-    NameError       -- if resource_type is neither workbook nor view
+    NameError       -- if resource_type is neither workbook, datasource, view nor project
     NameError       -- invalid project_name or invalid resource_name
     """
 
@@ -337,13 +1453,17 @@ def get_resource_id(resource_type, resource_name, project_name, server):
     # how to filter by multiple values?
     if resource_type == 'workbook':
         filtered_result, _ = server.workbooks.get(req_options=options)
+    elif resource_type == 'datasource':
+        filtered_result, _ = server.datasources.get(req_options=options)
     elif resource_type == 'view':
         filtered_result, _ = server.views.get(req_options=options)
+    elif resource_type == 'project':
+        filtered_result, _ = server.projects.get(req_options=options)
     else:
         raise NameError("Invalid resource_type")
     if not filtered_result:
         raise NameError("No {} with the name '{}' on the server".format(resource_type, resource_name))
-    if resource_type == "view":
+    if resource_type in ("view", "project"):
         result = filtered_result.pop()
         return (result.id, result)
     for result in filtered_result:
@@ -352,13 +1472,57 @@ def get_resource_id(resource_type, resource_name, project_name, server):
     raise NameError("No project with the name '{}' on the server".format(project_name))
 
 
-def get_resource_list(resource_type, server):
+class CompactItem(object):
+    """Slot based record keeping only the selected fields of a workbook, view, datasource or project"""
+
+    __slots__ = ()
+    fields = ()
+
+    def __init__(self, *values):
+        for field, value in zip(self.fields, values):
+            setattr(self, field, value)
+
+    @classmethod
+    def from_item(cls, item):
+        """Copy the selected fields of a server item, interning repeated strings like project and owner names"""
+        values = []
+        for field in cls.fields:
+            value = getattr(item, field, None)
+            # IDs are unique, interning them would only grow the intern table
+            if field != "id" and isinstance(value, str):
+                value = sys.intern(value)
+            values.append(value)
+        return (cls(*values))
+
+    def __repr__(self):
+        return ("CompactItem({})".format(", ".join("{}={!r}".format(field, getattr(self, field)) for field in self.fields)))
+
+
+def get_compact_record_type(fields):
+    """
+    Get the CompactItem subclass with slots for exactly the given fields
+
+    Parameters:
+    fields          -- names of the fields to keep, id and name are always kept - REQ
+
+    Return value(s):
+    record_type     -- subclass of CompactItem
+    """
+
+    fields = tuple(dict.fromkeys(("id", "name") + tuple(fields)))
+    if fields not in COMPACT_RECORD_TYPES:
+        COMPACT_RECORD_TYPES[fields] = type("CompactItem", (CompactItem,), {"__slots__": fields, "fields": fields})
+    return (COMPACT_RECORD_TYPES[fields])
+
+
+def get_resource_list(resource_type, server, fields=None):
     """
     Get a list of the resources of type resource_type on the server
 
     Parameters:
     resource_type   -- type of the resources ('workbook'/'view'/'datasource'/'project') - REQ
     server          -- the server object - REQ
+    fields          -- keep only these fields of every resource of every page as compact records (default: full objects of the first page) - OPT
 
     Return value(s):
     all_resources   -- list of all resources as objects
@@ -367,17 +1531,119 @@ def get_resource_list(resource_type, server):
     NameError       -- invalid resource_type
     """
 
+    endpoint = get_endpoint(resource_type, server)
+    if fields is None:
+        all_resources, pagination_item = endpoint.get()
+        return (all_resources)
+    return (list(iter_resources(endpoint, fields)))
+
+
+def get_endpoint(resource_type, server):
+    """
+    Get the endpoint of the server object for the resources of type resource_type
+
+    Parameters:
+    resource_type   -- type of the resources ('workbook'/'view'/'datasource'/'project') - REQ
+    server          -- the server object - REQ
+
+    Return value(s):
+    endpoint        -- the endpoint (e.g. server.workbooks)
+
+    Exception(s):
+    NameError       -- invalid resource_type
+    """
+
     if resource_type == "workbook":
-        all_resources, pagination_item = server.workbooks.get()
+        return (server.workbooks)
     elif resource_type == "datasource":
-        all_resources, pagination_item = server.datasources.get()
+        return (server.datasources)
     elif resource_type == "project":
-        all_resources, pagination_item = server.projects.get()
+        return (server.projects)
     elif resource_type == "view":
-        all_resources, pagination_item = server.views.get()
-    else:
-        raise NameError("Invalid resource_type '{}'".format(resource_type))
-    return (all_resources)
+        return (server.views)
+    raise NameError("Invalid resource_type '{}'".format(resource_type))
+
+
+def iter_resources(endpoint, fields):
+    """
+    Yield compact records of all the resources of an endpoint, page by page as the pages arrive
+
+    Parameters:
+    endpoint        -- the endpoint of the server object (e.g. server.workbooks) - REQ
+    fields          -- names of the fields to keep - REQ
+
+    Return value(s):
+    records         -- generator of CompactItem records
+
+    Exception(s):
+    NameError       -- a field is not an attribute of the resources
+    """
+
+    # only the full objects of the current page are kept in memory
+    record_type = get_compact_record_type(fields)
+    for index, item in enumerate(TSC.Pager(endpoint)):
+        if index == 0:
+            check_fields(item, record_type.fields)
+        yield (record_type.from_item(item))
+
+
+def check_fields(item, fields):
+    """
+    Check that every field is an attribute of the resource, a mistyped field would otherwise silently give a column of None
+
+    Exception(s):
+    NameError       -- a field is not an attribute of the resource
+    """
+
+    unknown_fields = [field for field in fields if not hasattr(item, field)]
+    if unknown_fields:
+        raise NameError("Invalid field(s) '{}'".format("', '".join(unknown_fields)))
+
+
+def write_records(records, output_format="ndjson", fields=None, output=None):
+    """
+    Write records as NDJSON or CSV, flushing after every record so consumers can start right away
+
+    Parameters:
+    records         -- iterable of dicts or objects - REQ
+    output_format   -- 'ndjson'/'csv' (default: 'ndjson') - OPT
+    fields          -- names of the fields to write (default: the keys of the first record, which has to be a dict) - OPT
+    output          -- file object to write to (default: stdout) - OPT
+
+    Exception(s):
+    NameError       -- invalid output_format
+    """
+
+    if output_format not in ("ndjson", "csv"):
+        raise NameError("Invalid output_format '{}'".format(output_format))
+    output = output or sys.stdout
+    writer = csv.writer(output) if output_format == "csv" else None
+    header_written = False
+    for record in records:
+        if fields is None:
+            fields = list(record)
+        values = [record.get(field) if isinstance(record, dict) else getattr(record, field, None) for field in fields]
+        if output_format == "ndjson":
+            # values like timestamps get written as strings
+            output.write(json.dumps(dict(zip(fields, values)), default=str) + "\n")
+        else:
+            # the header follows from the first record
+            if not header_written:
+                writer.writerow(fields)
+                header_written = True
+            writer.writerow([get_csv_cell(value) for value in values])
+        output.flush()
+
+
+def get_csv_cell(value):
+    """Flatten a value into a CSV cell: lists joined by ';', dicts as JSON, None empty"""
+    if value is None:
+        return ("")
+    if isinstance(value, (list, tuple, set)):
+        return (";".join(str(item) for item in value))
+    if isinstance(value, dict):
+        return (json.dumps(value, default=str))
+    return (value)
 
 
 def pick_object(all_resources, resource_type):
@@ -409,7 +1675,7 @@ def set_action_type(server, args):
     if action == "download":
         args.download = True
     elif action == "publish":
-        args.publish = input("Please enter the path of the file you would like to publish:\n")
+        args.publish = prompt_input(args, "Please enter the path of the file you would like to publish:\n")
     elif action == "refresh":
         args.refresh = True
 
@@ -426,6 +1692,16 @@ def parse_arguments():
     group_required.add_argument('--download', '-d', required=False,
                         help='filepath to save the file returned',
                         nargs='?', action='store', const=True)
+    group_required.add_argument('--schedule', action='store_true',
+                        help='work through the queued refresh requests')
+    group_required.add_argument('--loadtest', required=False,
+                        help='JSON file with the mix of views to render, e.g. [{"view": "Sales", "format": "pdf", "filters": {"Region": "West"}, "weight": 2}]')
+    group_required.add_argument('--mock-server', type=int, required=False,
+                        help='serve a mock server for offline load tests on this port')
+    group_required.add_argument('--list', action='store_true',
+                        help='write all the objects of --object-type without prompting')
+    group_required.add_argument('--resolve', action='store_true',
+                        help='write the object named --object-name without prompting')
     parser.add_argument('--server-url', '-s', required=False,
                         help='server address')
     parser.add_argument('--object-type', '-o', required=False,
@@ -444,6 +1720,48 @@ def parse_arguments():
                         help='project id where file gets publish in')
     group_project.add_argument('--project-name', '-n', required=False,
                         help='project name where file gets publish in')
+    parser.add_argument('--downstream', action='store_true',
+                        help='also refresh everything depending on the object, in dependency order')
+    parser.add_argument('--rebuild-lineage', action='store_true',
+                        help='rebuild the cached dependency graph before refreshing downstream')
+    parser.add_argument('--lineage-max-age', type=int, default=LINEAGE_MAX_AGE,
+                        help='seconds after which the cached dependency graph gets rebuilt (set to 1 day by default)')
+    parser.add_argument('--max-workers', type=int, default=4,
+                        help='maximum number of refreshes running in parallel (set to 4 by default)')
+    parser.add_argument('--enqueue', action='store_true',
+                        help='queue the refresh for the scheduler instead of refreshing right away')
+    parser.add_argument('--priority', type=int, default=5,
+                        help='priority of the queued refresh, lower runs first (set to 5 by default)')
+    parser.add_argument('--max-jobs', type=int, default=2,
+                        help='maximum number of refresh jobs the scheduler runs on the server at once (set to 2 by default)')
+    parser.add_argument('--max-retries', type=int, default=REFRESH_MAX_RETRIES,
+                        help='how often the scheduler retries a refresh that failed to start (set to {} by default)'.format(REFRESH_MAX_RETRIES))
+    parser.add_argument('--watch', action='store_true',
+                        help='keep the scheduler waiting for new requests once the queue is empty')
+    parser.add_argument('--watermark-column', required=False,
+                        help='publish only the rows of the CSV/Parquet file added since the last publish, appended to the datasource --object-name')
+    parser.add_argument('--initial-watermark', required=False,
+                        help='highest --watermark-column value the datasource already has, required for its first delta publish')
+    parser.add_argument('--slim', action='store_true',
+                        help='drop unreferenced data files from the .twbx/.tdsx and recompress it before publishing')
+    parser.add_argument('--compress-level', type=int, default=6,
+                        help='compression level of the slimmed package, 0-9 (set to 6 by default)')
+    parser.add_argument('--rps', type=float, required=False,
+                        help='renders per second the load test starts (open loop)')
+    parser.add_argument('--concurrency', type=int, required=False,
+                        help='renders the load test keeps running at the same time (closed loop)')
+    parser.add_argument('--duration', type=int, default=60,
+                        help='seconds the load test runs (set to 60 by default)')
+    parser.add_argument('--report-interval', type=int, default=10,
+                        help='seconds per line of the load test report (set to 10 by default)')
+    parser.add_argument('--mock-latency', type=float, default=0.05,
+                        help='seconds every render of the mock server takes (set to 0.05 by default)')
+    parser.add_argument('--mock-error-rate', type=float, default=0.0,
+                        help='fraction of the renders of the mock server failing with HTTP 500 (set to 0 by default)')
+    parser.add_argument('--output', choices=['ndjson', 'csv'], required=False,
+                        help='write results as machine-readable records instead of messages')
+    parser.add_argument('--fields', required=False,
+                        help='comma separated fields of the listed/resolved objects (set to id,name and the project by default)')
     parser.add_argument('--logging-level', '-l',
                         choices=['debug', 'info', 'error'], default='error',
                         help='desired logging level (set to error by default)')
@@ -459,33 +1777,63 @@ def download_cli(server, args):
                 title='What do you want to download?', indicator='->')
     if args.object_name is None:
         # get list of all the objects on the server of chosen type
-        all_objects = get_resource_list(args.object_type, server)
+        all_objects = get_resource_list(args.object_type, server, fields=PICK_FIELDS[args.object_type])
         # let user select one of the objects
         selected_object, args.object_id, args.object_name = pick_object(all_objects, args.object_type)
     else:
-        selected_object = get_filtered_result(server, args.object_name, args.object_type)
-        args.object_id = selected_object.id
+        args.object_id, selected_object = get_resource_id(args.object_type, args.object_name, args.project_name, server)
     if args.object_type == "workbook" or args.object_type == "datasource":
         project_name = selected_object.project_name
-        download(resource_type=args.object_type, resource_name=args.object_name, project_name=project_name, server=server)
+        file_path = download(resource_type=args.object_type, resource_name=args.object_name, project_name=project_name, server=server)
     elif args.object_type == "view":
-        download_view_image(args.object_name, server=server)
+        file_path = download_view_image(args.object_name, server=server)
+    output_result(args, [{"resource_id": args.object_id, "path": file_path}])
 
 
 def publish_cli(server, args):
+    # a delta publish appends to an existing datasource, so it needs its name
+    if args.watermark_column:
+        if args.object_type not in (None, "datasource"):
+            raise TypeError("--watermark-column requires --object-type datasource")
+        if args.object_name is None:
+            raise TypeError("--watermark-column requires --object-name")
+        args.object_type = "datasource"
     # if user hasn't specified yet what the resource_type is let them choose one
     if args.object_type is None:
         args.object_type, _ = pick.pick(['workbook', 'datasource'],
                 title='What do you want to publish?', indicator='->')
     # if user hasn't specified a resource_name yet let them pick one
-    if args.project_name is None:
+    project_name = args.project_name
+    if project_name is None:
         # get list of all the objects on the server of chosen type
-        all_objects = get_resource_list("project", server)
+        all_objects = get_resource_list("project", server, fields=PICK_FIELDS["project"])
         # let user select one of the objects
         selected_object, project_id_id, project_name = pick_object(all_objects, "project")
-    # publish resource
-    publish(resource_type=args.object_type, path=args.publish,
-        project_name=project_name, mode="CreateNew", server=server)
+    # append the rows added since the last delta publish
+    if args.watermark_column:
+        resource_id, watermark = publish_delta(args.publish, args.watermark_column, args.object_name,
+            project_name, server=server, initial_watermark=args.initial_watermark)
+        if resource_id is None:
+            message = "No new rows since watermark {0}.".format(watermark)
+        else:
+            message = "Appended the new rows to {0}. Watermark: {1}".format(args.object_name, watermark)
+        output_result(args, [{"resource_id": resource_id, "watermark": watermark}], message)
+        return
+    # (optional) slim the package before publishing, keeping the file name the resource gets named after
+    with tempfile.TemporaryDirectory() as package_dir:
+        path = args.publish
+        report = {"original_size": None, "packaged_size": None, "saved": None, "dropped": None}
+        message = None
+        if args.slim:
+            path = os.path.join(package_dir, os.path.basename(args.publish))
+            report = slim_package(args.publish, path, compresslevel=args.compress_level)
+            message = "Dropped {0} unreferenced file(s), saved {1} of {2} bytes.".format(
+                len(report["dropped"]), report["saved"], report["original_size"])
+        # publish resource
+        resource_id = publish(resource_type=args.object_type, path=path,
+            project_name=project_name, mode="CreateNew", server=server)
+        # one record with the same fields for every publish
+        output_result(args, [dict(report, resource_id=resource_id)], message)
 
 
 def refresh_cli(server, args):
@@ -496,27 +1844,122 @@ def refresh_cli(server, args):
     # if user hasn't specified a resource_name yet let them pick one
     if args.object_name is None:
         # get list of all the objects on the server of chosen type
-        all_objects = get_resource_list(args.object_type, server)
+        all_objects = get_resource_list(args.object_type, server, fields=PICK_FIELDS[args.object_type])
         # let user select one of the objects
         resource_object, _, args.object_name = pick_object(all_objects, args.object_type)
-    # refresh the resource
-    refresh(args.object_type, args.object_name, resource_object.project_name, server=server)
+    else:
+        _, resource_object = get_resource_id(args.object_type, args.object_name, args.project_name, server)
+    # queue the refresh for the scheduler
+    if args.enqueue:
+        if enqueue_refresh(args.object_type, resource_object.id, priority=args.priority):
+            output_result(args, [{"resource_id": resource_object.id, "status": "queued"}],
+                "Queued the refresh of {0}.".format(args.object_name))
+        else:
+            output_result(args, [{"resource_id": resource_object.id, "status": "coalesced"}],
+                "A refresh of {0} is already queued or running.".format(args.object_name))
+    # refresh the resource and (optional) everything depending on it
+    elif args.downstream:
+        results = refresh_downstream(args.object_type, args.object_name, resource_object.project_name, server=server,
+                max_workers=args.max_workers, rebuild_lineage=args.rebuild_lineage, lineage_max_age=args.lineage_max_age)
+        output_status_results(args, results)
+    else:
+        resource_id = refresh(args.object_type, args.object_name, resource_object.project_name, server=server)
+        output_result(args, [{"resource_id": resource_id, "status": "refreshing"}])
+
+
+def loadtest_cli(server, args):
+    # the load tester builds on this module, so it only gets imported when used
+    import tableau_loadtest
+    # read the mix of views
+    with open(args.loadtest) as mix_file:
+        mix = json.load(mix_file)
+    report = tableau_loadtest.run_loadtest(server, mix, rps=args.rps, concurrency=args.concurrency,
+            duration=args.duration, report_interval=args.report_interval)
+    summaries = report["intervals"] + [dict(report, start="total")]
+    if args.output:
+        write_records(summaries, args.output, fields=["start", "requests", "errors", "error_rate", "throughput", "p50", "p95", "p99"])
+        return
+    # print the report over time and the summary
+    line = "{0:>8} {1:>8} {2:>7.1%} {3:>8.1f}/s {4:>8} {5:>8} {6:>8}"
+    print("{0:>8} {1:>8} {2:>7} {3:>10} {4:>8} {5:>8} {6:>8}".format("start", "requests", "errors", "throughput", "p50", "p95", "p99"))
+    for summary in summaries:
+        latencies = ["-" if summary[key] is None else "{:.3f}s".format(summary[key]) for key in ("p50", "p95", "p99")]
+        print(line.format(summary["start"], summary["requests"], summary["error_rate"], summary["throughput"], *latencies))
+
+
+def list_cli(server, args):
+    # write every object as soon as its page arrives, only with the requested fields
+    if args.object_type is None:
+        raise TypeError("--list requires --object-type")
+    endpoint = get_endpoint(args.object_type, server)
+    fields = get_fields(args)
+    write_records(iter_resources(endpoint, fields), args.output or "ndjson", fields)
+
+
+def resolve_cli(server, args):
+    # write the object with the given name
+    if args.object_type is None or args.object_name is None:
+        raise TypeError("--resolve requires --object-type and --object-name")
+    fields = get_fields(args)
+    _, resource_object = get_resource_id(args.object_type, args.object_name, args.project_name, server)
+    check_fields(resource_object, fields)
+    write_records([resource_object], args.output or "ndjson", fields)
+
+
+def get_fields(args):
+    """Fields of --fields (comma separated, whitespace around them ignored), the pick fields of --object-type by default"""
+    if args.fields:
+        return ([field.strip() for field in args.fields.split(",") if field.strip()])
+    return (list(PICK_FIELDS[args.object_type]))
+
+
+def prompt_input(args, prompt):
+    """Ask the user for input, prompting on stderr if stdout carries the records of --output"""
+    if not args.output:
+        return (input(prompt))
+    sys.stderr.write(prompt)
+    sys.stderr.flush()
+    return (input())
+
+
+def output_result(args, records, message=None):
+    """Write the results of an operation as records if an output format is set, else print the message"""
+    if args.output:
+        write_records(records, args.output)
+    elif message is not None:
+        print(message)
+
+
+def output_status_results(args, results):
+    """Write the status of every resource of a refresh run"""
+    if args.output:
+        write_records(({"resource_id": resource_id, "status": status} for resource_id, status in results.items()), args.output)
+    else:
+        for resource_id, status in results.items():
+            print("{0}: {1}".format(resource_id, status))
 
 
 def main():
     # parse the passed arguments
     args = parse_arguments()
+    # the mock server needs no authentication
+    if args.mock_server:
+        print("Mock server listening on http://localhost:{0}".format(args.mock_server))
+        # the load tester builds on this module, so it only gets imported when used
+        import tableau_loadtest
+        tableau_loadtest.run_mock_server(args.mock_server, latency=args.mock_latency, error_rate=args.mock_error_rate)
+        return
     # authenticate
     server = None
     while (server is None):
-        # get credentials from user
-        server_url = input("Server: ")
-        username = str(input("Username: "))
-        password = getpass()
+        # get credentials from the arguments/environment or the user
+        server_url = args.server_url or prompt_input(args, "Server: ")
+        username = args.username or str(prompt_input(args, "Username: "))
+        password = os.environ.get("TABLEAU_PASSWORD") or getpass()
         server = authenticate(server_url, username, password)
     # if the user didn't set the flags they will get prompted
     # to choose an action (download, publish, refresh)
-    if args.download is None and args.publish is None and args.refresh is False:
+    if not (args.download or args.publish or args.refresh or args.schedule or args.loadtest or args.list or args.resolve):
         set_action_type(server, args)
     # if the user chose 'download'
     if args.download:
@@ -527,6 +1970,22 @@ def main():
     # if the user chose 'refresh'
     elif args.refresh:
         refresh_cli(server, args)
+    # if the user chose 'schedule'
+    elif args.schedule:
+        results = run_refresh_scheduler(server, max_jobs=args.max_jobs, watch=args.watch, max_retries=args.max_retries)
+        if results is None:
+            print("Another scheduler is already working through the refresh queue.", file=sys.stderr)
+        else:
+            output_status_results(args, results)
+    # if the user chose 'loadtest'
+    elif args.loadtest:
+        loadtest_cli(server, args)
+    # if the user chose 'list'
+    elif args.list:
+        list_cli(server, args)
+    # if the user chose 'resolve'
+    elif args.resolve:
+        resolve_cli(server, args)
     server.auth.sign_out()
 
 
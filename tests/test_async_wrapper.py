@@ -0,0 +1,190 @@
+import asyncio
+import os
+
+import pytest
+from aiohttp import web
+
+import tableau_async_wrapper
+
+
+PROJECTS = [{"id": "p-{}".format(index), "name": "Sales, EMEA" if index == 1500 else "Project {}".format(index)}
+        for index in range(2000)]
+
+
+class FakeApi(object):
+    """REST API that is overloaded for the first requests, lists the projects page by page and records uploads and refreshes"""
+
+    def __init__(self, overloaded=0):
+        self.overloaded = overloaded
+        self.filters = []
+        self.requests = 0
+        self.chunks = []
+        self.commits = []
+        self.refreshed = []
+
+    def application(self):
+        app = web.Application()
+        app.router.add_get("/api/2.4/serverinfo", self.serverinfo)
+        app.router.add_post("/api/3.4/auth/signin", self.sign_in)
+        app.router.add_post("/api/3.4/auth/signout", self.sign_out)
+        app.router.add_get("/api/3.4/sites/site-id/projects", self.projects)
+        app.router.add_get("/api/3.4/sites/site-id/workbooks", self.workbooks)
+        app.router.add_get("/api/3.4/sites/site-id/workbooks/{id}/content", self.content)
+        app.router.add_post("/api/3.4/sites/site-id/fileUploads", self.start_upload)
+        app.router.add_put("/api/3.4/sites/site-id/fileUploads/{upload_id}", self.append_upload)
+        app.router.add_post("/api/3.4/sites/site-id/{resource_type:workbooks|datasources}", self.commit_upload)
+        app.router.add_post("/api/3.4/sites/site-id/workbooks/{id}/refresh", self.refresh)
+        return (app)
+
+    async def serverinfo(self, request):
+        return (web.json_response({"serverInfo": {"restApiVersion": "3.4"}}))
+
+    async def sign_in(self, request):
+        return (web.json_response({"credentials": {"token": "token", "site": {"id": "site-id"}}}))
+
+    async def sign_out(self, request):
+        return (web.Response(status=204))
+
+    async def projects(self, request):
+        self.requests += 1
+        if self.overloaded:
+            self.overloaded -= 1
+            return (web.Response(status=503, headers={"Retry-After": "0"}))
+        self.filters.append(request.query.get("filter"))
+        projects = PROJECTS
+        if "filter" in request.query:
+            projects = [project for project in PROJECTS if "name:eq:" + project["name"] == request.query["filter"]]
+        page_number, page_size = int(request.query["pageNumber"]), int(request.query["pageSize"])
+        page = projects[(page_number - 1) * page_size:page_number * page_size]
+        return (web.json_response({"pagination": {"pageNumber": str(page_number), "pageSize": str(page_size),
+                "totalAvailable": str(len(projects))}, "projects": {"project": page}}))
+
+    async def workbooks(self, request):
+        return (web.json_response({"pagination": {"pageNumber": "1", "pageSize": "1000", "totalAvailable": "1"},
+                "workbooks": {"workbook": [{"id": "wb-1", "name": "Revenue", "project": {"name": "Finance"}}]}}))
+
+    async def start_upload(self, request):
+        return (web.json_response({"fileUpload": {"uploadSessionId": "upload-1", "fileSize": "0"}}))
+
+    async def append_upload(self, request):
+        parts = await read_multipart(request)
+        assert request.match_info["upload_id"] == "upload-1" and parts["request_payload"] == b""
+        self.chunks.append(parts["tableau_file"])
+        return (web.json_response({"fileUpload": {"uploadSessionId": "upload-1"}}))
+
+    async def commit_upload(self, request):
+        parts = await read_multipart(request)
+        self.commits.append((request.match_info["resource_type"], dict(request.query), parts["request_payload"].decode("utf-8")))
+        resource_type = request.match_info["resource_type"][:-1]
+        return (web.json_response({resource_type: {"id": "{}-new".format(resource_type)}}))
+
+    async def refresh(self, request):
+        self.refreshed.append(request.match_info["id"])
+        return (web.json_response({"job": {"id": "job-1", "type": "RefreshExtract"}}))
+
+    async def content(self, request):
+        # no Content-Disposition header
+        return (web.Response(body=b"PK\x03\x04", content_type="application/octet-stream"))
+
+
+async def read_multipart(request):
+    """Parts of a multipart body by their name"""
+    reader = await request.multipart()
+    parts = {}
+    while True:
+        part = await reader.next()
+        if part is None:
+            return (parts)
+        parts[part.name] = await part.read()
+
+
+def run_with_server(api, operation):
+    async def run():
+        runner = web.AppRunner(api.application())
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        port = runner.addresses[0][1]
+        try:
+            server = await tableau_async_wrapper.authenticate("http://127.0.0.1:{}".format(port), "user", "password")
+            async with server:
+                return (await operation(server))
+        finally:
+            await runner.cleanup()
+
+    return (asyncio.run(run()))
+
+
+def test_get_project_id_matches_unsafe_names_locally():
+    api = FakeApi()
+
+    assert run_with_server(api, lambda server: tableau_async_wrapper.get_project_id("Sales, EMEA", server)) == "p-1500"
+    assert run_with_server(api, lambda server: tableau_async_wrapper.get_project_id("Project 7", server)) == "p-7"
+    # the name with a comma is looked up page by page without a filter
+    assert api.filters == [None, None, "name:eq:Project 7"]
+
+
+def test_request_retries_overloaded_server():
+    api = FakeApi(overloaded=2)
+
+    assert run_with_server(api, lambda server: tableau_async_wrapper.get_project_id("Project 7", server)) == "p-7"
+    assert api.requests == 3
+
+
+def test_get_retry_delay():
+    assert tableau_async_wrapper.get_retry_delay("7", 3) == 7
+    assert 0 <= tableau_async_wrapper.get_retry_delay("Wed, 21 Oct 2026 07:28:00 GMT", 2) <= 4
+    assert 0 <= tableau_async_wrapper.get_retry_delay(None, 0) <= 1
+
+
+def test_download_without_content_disposition(tmp_path):
+    api = FakeApi()
+
+    file_path = run_with_server(api, lambda server: tableau_async_wrapper.download(
+            "workbook", "Revenue", "Finance", path=str(tmp_path), server=server))
+
+    assert file_path == os.path.join(str(tmp_path), "Revenue.twbx")
+    with open(file_path, "rb") as resource_file:
+        assert resource_file.read() == b"PK\x03\x04"
+
+
+def test_publish_uploads_in_chunks(tmp_path, monkeypatch):
+    api = FakeApi()
+    monkeypatch.setattr(tableau_async_wrapper, "UPLOAD_CHUNK_SIZE", 1000)
+    data = os.urandom(2500)
+    path = tmp_path / "Sales & Returns.twbx"
+    path.write_bytes(data)
+
+    resource_id = run_with_server(api, lambda server: tableau_async_wrapper.publish(
+            "workbook", "Project 7", str(path), "Overwrite", server=server))
+
+    assert resource_id == "workbook-new"
+    assert [len(chunk) for chunk in api.chunks] == [1000, 1000, 500] and b"".join(api.chunks) == data
+    (resource_type, params, payload), = api.commits
+    assert resource_type == "workbooks"
+    assert params == {"uploadSessionId": "upload-1", "workbookType": "twbx", "overwrite": "true", "asJob": "false"}
+    assert payload == '<tsRequest><workbook name="Sales &amp; Returns"><project id="p-7"/></workbook></tsRequest>'
+
+
+def test_publish_appends_to_datasource(tmp_path):
+    api = FakeApi()
+    path = tmp_path / "sales.hyper"
+    path.write_bytes(b"hyper")
+
+    assert run_with_server(api, lambda server: tableau_async_wrapper.publish(
+            "datasource", "Project 7", str(path), "Append", server=server)) == "datasource-new"
+    assert api.chunks == [b"hyper"]
+    assert api.commits[0][:2] == ("datasources", {"uploadSessionId": "upload-1", "datasourceType": "hyper", "append": "true"})
+
+
+def test_publish_rejects_invalid_mode():
+    with pytest.raises(NameError, match="Invalid mode 'Append'"):
+        asyncio.run(tableau_async_wrapper.publish("workbook", "Project 7", "report.twbx", "Append", server=object()))
+
+
+def test_refresh():
+    api = FakeApi()
+
+    assert run_with_server(api, lambda server: tableau_async_wrapper.refresh(
+            "workbook", "Revenue", "Finance", server=server)) == "wb-1"
+    assert api.refreshed == ["wb-1"]
@@ -0,0 +1,44 @@
+import sys
+import types
+
+import pytest
+
+import tableau_wrapper
+
+
+def fake_endpoint(items):
+    """Endpoint returning all items as a single page"""
+    def get(req_options):
+        return (items, types.SimpleNamespace(page_number=1, page_size=len(items), total_available=len(items)))
+    return (get)
+
+
+def test_iter_resources_keeps_only_selected_fields():
+    items = [types.SimpleNamespace(id=str(index), name="View {}".format(index), project_name="".join(["Fin", "ance"]),
+            owner_id="owner-1", description="unused") for index in range(3)]
+    records = list(tableau_wrapper.iter_resources(fake_endpoint(items), ("project_name",)))
+    assert [(record.id, record.name, record.project_name) for record in records] == [
+            ("0", "View 0", "Finance"), ("1", "View 1", "Finance"), ("2", "View 2", "Finance")]
+    assert not hasattr(records[0], "description")
+    assert not hasattr(records[0], "__dict__")
+    # repeated strings are shared
+    assert records[0].project_name is records[2].project_name is sys.intern("Finance")
+
+
+def test_iter_resources_rejects_unknown_fields():
+    items = [types.SimpleNamespace(id="1", name="View", project_name="Finance")]
+    with pytest.raises(NameError, match="projct_name"):
+        list(tableau_wrapper.iter_resources(fake_endpoint(items), ("projct_name",)))
+
+
+def test_compact_record_types_are_reused():
+    assert tableau_wrapper.get_compact_record_type(("name", "owner_id")) is tableau_wrapper.get_compact_record_type(("owner_id",))
+
+
+def test_pick_fields_exist_on_server_items():
+    import tableauserverclient as TSC
+    items = {"workbook": TSC.WorkbookItem("project-1"), "datasource": TSC.DatasourceItem("project-1"),
+            "view": TSC.ViewItem(), "project": TSC.ProjectItem("Finance")}
+    for resource_type, item in items.items():
+        for field in tableau_wrapper.PICK_FIELDS[resource_type]:
+            assert hasattr(item, field), (resource_type, field)
@@ -0,0 +1,162 @@
+import datetime
+import fcntl
+import json
+import types
+
+import pytest
+
+import tableau_wrapper
+
+
+class FakeServer(object):
+    """Records the extracts appended to datasources"""
+
+    def __init__(self, watermark_path, server_address="https://prod.example.com"):
+        self.watermark_path = watermark_path
+        self.server_address = server_address
+        self.site_url = "finance"
+        self.published = []
+        self.datasources = self
+
+    def publish(self, item, path, mode):
+        # overlapping delta publishes have to wait for this one
+        with open(self.watermark_path + ".lock", "w") as lock_file:
+            with pytest.raises(BlockingIOError):
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        self.published.append((item.name, mode))
+        return (types.SimpleNamespace(id="ds-" + item.name))
+
+
+def write_csv(path, lines):
+    path.write_text("\n".join(lines) + "\n")
+    return (str(path))
+
+
+@pytest.fixture
+def extracts(monkeypatch):
+    """Collect the rows written to extracts instead of running hyper"""
+    written = []
+
+    def write_extract(extract_path, columns, column_types, rows):
+        written.append((columns, column_types, list(rows)))
+
+    monkeypatch.setattr(tableau_wrapper, "write_extract", write_extract)
+    monkeypatch.setattr(tableau_wrapper, "get_project_id", lambda project_name, server: "project-id")
+    return (written)
+
+
+def test_csv_column_types_keep_values_intact(tmp_path):
+    data_path = write_csv(tmp_path / "data.csv", [
+        "id,code,amount,day,at,note",
+        "1,007,1,2024-01-31,2024-01-31 10:00:00,",
+        "2,012,1.5,2024-02-01,2024-02-01T11:30:00.250,",
+    ])
+
+    columns, column_types, row_count, watermark = tableau_wrapper.scan_delta_csv(data_path, "id", None)
+
+    assert column_types == ["big_int", "text", "double", "date", "timestamp", "text"]
+    assert (row_count, watermark) == (2, 2)
+    rows = list(tableau_wrapper.iter_delta_csv(data_path, "id", None, column_types))
+    assert rows[0] == [1, "007", 1.0, datetime.date(2024, 1, 31), datetime.datetime(2024, 1, 31, 10), None]
+
+
+def test_csv_scan_compares_watermarks_by_type(tmp_path):
+    data_path = write_csv(tmp_path / "data.csv", ["at,value", "2024-01-02,a", "2024-01-10,b", "2023-12-31,c"])
+
+    _, column_types, row_count, watermark = tableau_wrapper.scan_delta_csv(data_path, "at", "2024-01-05")
+
+    assert (column_types, row_count, watermark) == (["date", "text"], 1, "2024-01-10")
+
+
+def test_csv_scan_rejects_empty_watermark(tmp_path):
+    data_path = write_csv(tmp_path / "data.csv", ["id,value", "1,a", ",b"])
+
+    with pytest.raises(ValueError, match="Line 3 .*Empty value in the watermark column 'id'"):
+        tableau_wrapper.scan_delta_csv(data_path, "id", None)
+
+
+def test_csv_scan_reuses_schema(tmp_path):
+    data_path = write_csv(tmp_path / "data.csv", ["id,code", "1,007", "2,008"])
+
+    # the stored schema wins over what the new rows look like
+    _, column_types, _, _ = tableau_wrapper.scan_delta_csv(data_path, "id", 1, (["id", "code"], ["big_int", "text"]))
+    assert column_types == ["big_int", "text"]
+    write_csv(tmp_path / "data.csv", ["id,code", "1,7", "2,x"])
+    with pytest.raises(ValueError, match="Line 3 .*'x' is no big_int value"):
+        tableau_wrapper.scan_delta_csv(data_path, "id", 1, (["id", "code"], ["big_int", "big_int"]))
+    with pytest.raises(ValueError, match="don't match the columns"):
+        tableau_wrapper.scan_delta_csv(data_path, "id", 1, (["id", "name"], ["big_int", "text"]))
+
+
+def test_parquet_scan(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    data_path = str(tmp_path / "data.parquet")
+    table = pa.table({"id": [1, 2, 3], "at": [datetime.date(2024, 1, day) for day in (1, 2, 3)], "value": ["a", "b", "c"]})
+    pq.write_table(table, data_path, row_group_size=2)
+
+    columns, column_types, row_count, watermark = tableau_wrapper.scan_delta_parquet(data_path, "at", "2024-01-01")
+
+    assert (columns, column_types) == (["id", "at", "value"], ["big_int", "date", "text"])
+    assert (row_count, watermark) == (2, "2024-01-03")
+    rows = list(tableau_wrapper.iter_delta_parquet(data_path, "at", "2024-01-01", column_types))
+    assert [row[0] for row in rows] == [2, 3]
+    with pytest.raises(ValueError, match="don't match the columns"):
+        tableau_wrapper.scan_delta_parquet(data_path, "at", None, (columns, ["big_int", "date", "big_int"]))
+    pq.write_table(pa.table({"id": [1, None]}), data_path)
+    with pytest.raises(ValueError, match="Empty value in the watermark column 'id'"):
+        tableau_wrapper.scan_delta_parquet(data_path, "id", None)
+
+
+def test_publish_delta_stores_and_reuses_schema(tmp_path, extracts):
+    watermark_path = str(tmp_path / "watermarks.json")
+    server = FakeServer(watermark_path)
+    data_path = write_csv(tmp_path / "data.csv", ["id,code", "1,007", "2,008"])
+
+    assert tableau_wrapper.publish_delta(data_path, "id", "sales", "proj", server=server,
+            initial_watermark="0", watermark_path=watermark_path) == ("ds-sales", 2)
+    with open(watermark_path) as watermark_file:
+        assert json.load(watermark_file) == {"https://prod.example.com|finance|proj/sales": {"watermark": 2,
+                "columns": ["id", "code"], "column_types": ["big_int", "text"]}}
+
+    # the new rows alone would be inferred as big_int, the stored schema keeps the column text
+    write_csv(tmp_path / "data.csv", ["id,code", "1,007", "2,008", "3,9"])
+    assert tableau_wrapper.publish_delta(data_path, "id", "sales", "proj", server=server,
+            watermark_path=watermark_path) == ("ds-sales", 3)
+    assert extracts[1] == (["id", "code"], ["big_int", "text"], [[3, "9"]])
+    assert server.published == [("sales", "Append"), ("sales", "Append")]
+    assert tableau_wrapper.publish_delta(data_path, "id", "sales", "proj", server=server,
+            watermark_path=watermark_path) == (None, 3)
+
+
+def test_publish_delta_requires_datasource_name(tmp_path, extracts):
+    data_path = write_csv(tmp_path / "data.csv", ["id", "1"])
+
+    with pytest.raises(NameError, match="Missing datasource_name"):
+        tableau_wrapper.publish_delta(data_path, "id", None, "proj", server=object(),
+                watermark_path=str(tmp_path / "watermarks.json"))
+    assert extracts == []
+
+
+def test_publish_delta_requires_initial_watermark(tmp_path, extracts):
+    watermark_path = str(tmp_path / "watermarks.json")
+    data_path = write_csv(tmp_path / "data.csv", ["id", "1", "2"])
+
+    # appending every row to an existing datasource would duplicate its rows
+    with pytest.raises(ValueError, match="initial watermark is required"):
+        tableau_wrapper.publish_delta(data_path, "id", "sales", "proj", server=FakeServer(watermark_path),
+                watermark_path=watermark_path)
+    assert extracts == []
+
+
+def test_publish_delta_keeps_watermarks_per_server(tmp_path, extracts):
+    watermark_path = str(tmp_path / "watermarks.json")
+    data_path = write_csv(tmp_path / "data.csv", ["id", "1", "2", "3"])
+    staging = FakeServer(watermark_path, "https://staging.example.com")
+
+    assert tableau_wrapper.publish_delta(data_path, "id", "sales", "proj", server=staging,
+            initial_watermark=0, watermark_path=watermark_path) == ("ds-sales", 3)
+    # prod still starts from its own initial watermark
+    assert tableau_wrapper.publish_delta(data_path, "id", "sales", "proj", server=FakeServer(watermark_path),
+            initial_watermark=1, watermark_path=watermark_path) == ("ds-sales", 3)
+    assert [rows for _, _, rows in extracts] == [[[1], [2], [3]], [[2], [3]]]
@@ -0,0 +1,106 @@
+import json
+import os
+import time
+import types
+
+import pytest
+
+import tableau_wrapper
+
+
+FIXTURE_PATH = os.path.join(os.path.dirname(__file__), "fixtures", "metadata_lineage.json")
+
+
+class FakeMetadata(object):
+    """Replays Metadata API responses page by page, following the endCursor of the previous page"""
+
+    def __init__(self):
+        with open(FIXTURE_PATH) as fixture_file:
+            self.pages = json.load(fixture_file)
+        self.queries = []
+
+    def query(self, query, variables=None):
+        connection = "workbooksConnection" if "workbooksConnection" in query else "publishedDatasourcesConnection"
+        self.queries.append((connection, variables["after"]))
+        pages = self.pages[connection]
+        if variables["after"] is None:
+            return (pages[0])
+        for index, page in enumerate(pages):
+            if page["data"][connection]["pageInfo"]["endCursor"] == variables["after"]:
+                return (pages[index + 1])
+
+
+class FakeEndpoint(object):
+    def __init__(self, log):
+        self.log = log
+
+    def refresh(self, resource_id):
+        self.log.append(resource_id)
+        return (types.SimpleNamespace(id="job-" + resource_id))
+
+
+def fake_server():
+    log = []
+    return (types.SimpleNamespace(metadata=FakeMetadata(), workbooks=FakeEndpoint(log), datasources=FakeEndpoint(log),
+            jobs=types.SimpleNamespace(wait_for_job=lambda job_id: job_id), log=log))
+
+
+def test_build_lineage_graph_links_workbooks_to_upstream_datasources(tmp_path):
+    server = fake_server()
+    graph = tableau_wrapper.build_lineage_graph(server, str(tmp_path / "lineage.json"))
+    assert graph["edges"] == {"ds-sales": ["wb-revenue", "wb-plan", "wb-live"], "ds-targets": ["wb-plan"]}
+    assert graph["nodes"]["wb-ops"] == {"type": "workbook", "name": "Operations", "project_name": "Ops", "has_extracts": True}
+    # one extract among the embedded datasources is enough, a live connection only has none
+    assert graph["nodes"]["wb-plan"]["has_extracts"] and not graph["nodes"]["wb-live"]["has_extracts"]
+    # the second workbook page got requested with the cursor of the first
+    assert ("workbooksConnection", "d2ItcGxhbg==") in server.metadata.queries
+    with open(str(tmp_path / "lineage.json")) as cache_file:
+        assert json.load(cache_file)["edges"] == graph["edges"]
+
+
+def test_get_lineage_graph_rebuilds_expired_cache(tmp_path):
+    cache_path = str(tmp_path / "lineage.json")
+    with open(cache_path, "w") as cache_file:
+        json.dump({"created_at": time.time() - 120, "nodes": {}, "edges": {}}, cache_file)
+    assert tableau_wrapper.get_lineage_graph(fake_server(), cache_path, max_age=3600)["nodes"] == {}
+    assert "wb-plan" in tableau_wrapper.get_lineage_graph(fake_server(), cache_path, max_age=60)["nodes"]
+
+
+def test_get_downstream_resources():
+    graph = tableau_wrapper.build_lineage_graph(fake_server(), None)
+    assert tableau_wrapper.get_downstream_resources(graph, "ds-sales") == {
+            "ds-sales": set(), "wb-revenue": {"ds-sales"}, "wb-plan": {"ds-sales"}, "wb-live": {"ds-sales"}}
+    assert tableau_wrapper.get_downstream_resources(graph, "wb-ops") == {"wb-ops": set()}
+    with pytest.raises(NameError):
+        tableau_wrapper.get_downstream_resources(graph, "missing")
+
+
+def test_refresh_downstream_refreshes_root_before_dependents(tmp_path, monkeypatch):
+    server = fake_server()
+    monkeypatch.setattr(tableau_wrapper, "get_resource_id", lambda *args: ("ds-sales", None))
+    results = tableau_wrapper.refresh_downstream("datasource", "Sales", "Finance", server=server,
+            cache_path=str(tmp_path / "lineage.json"))
+    # the workbook connecting live to the datasource has nothing to refresh
+    assert results == {"ds-sales": "refreshed", "wb-revenue": "refreshed", "wb-plan": "refreshed", "wb-live": "not_needed"}
+    assert server.log[0] == "ds-sales"
+    assert sorted(server.log[1:]) == ["wb-plan", "wb-revenue"]
+
+
+def test_refresh_downstream_skips_dependents_of_failed_refresh(tmp_path, monkeypatch):
+    server = fake_server()
+    def failing_refresh(resource_id):
+        raise RuntimeError("backgrounder unavailable")
+    server.datasources.refresh = failing_refresh
+    monkeypatch.setattr(tableau_wrapper, "get_resource_id", lambda *args: ("ds-sales", None))
+    results = tableau_wrapper.refresh_downstream("datasource", "Sales", "Finance", server=server,
+            cache_path=str(tmp_path / "lineage.json"))
+    assert results == {"ds-sales": "failed", "wb-revenue": "skipped", "wb-plan": "skipped", "wb-live": "skipped"}
+
+
+def test_refresh_downstream_live_root_needs_no_refresh(tmp_path, monkeypatch):
+    server = fake_server()
+    monkeypatch.setattr(tableau_wrapper, "get_resource_id", lambda *args: ("wb-live", None))
+    results = tableau_wrapper.refresh_downstream("workbook", "Live Sales", "Finance", server=server,
+            cache_path=str(tmp_path / "lineage.json"))
+    assert results == {"wb-live": "not_needed"}
+    assert server.log == []
@@ -0,0 +1,77 @@
+import logging
+import threading
+
+import pytest
+
+import tableau_loadtest
+import tableau_wrapper
+
+
+@pytest.fixture
+def mock_server():
+    servers = []
+
+    def serve(latency=0.0, error_rate=0.0):
+        server = tableau_loadtest.get_mock_server(0, latency=latency, error_rate=error_rate)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return (tableau_wrapper.authenticate("http://localhost:{}".format(server.server_address[1]), "user", "password"))
+
+    yield (serve)
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_summarize_samples():
+    samples = [(0.1, latency / 100, True) for latency in range(1, 101)] + [(0.2, 5.0, False)] * 25
+
+    summary = tableau_loadtest.summarize_samples(samples, 2.0)
+
+    assert summary["requests"] == 125 and summary["errors"] == 25
+    assert summary["error_rate"] == 0.2
+    # only successful renders count towards throughput and latency
+    assert summary["throughput"] == 50.0
+    assert (summary["p50"], summary["p95"], summary["p99"]) == (0.51, 0.96, 1.0)
+    assert tableau_loadtest.summarize_samples([], 0) == {"requests": 0, "errors": 0, "error_rate": 0.0,
+            "throughput": 0.0, "p50": None, "p95": None, "p99": None}
+
+
+def test_loadtest_against_mock_server(mock_server):
+    server = mock_server(latency=0.01, error_rate=0.5)
+    mix = [{"view": "Sales", "weight": 3}, {"view": "Targets", "format": "pdf", "filters": {"Region": "West"}}]
+
+    report = tableau_loadtest.run_loadtest(server, mix, rps=40, duration=1.5, report_interval=1, seed=1)
+
+    assert report["requests"] == 60
+    assert 0.25 < report["error_rate"] < 0.75
+    assert 0.01 <= report["p50"] < 1.0
+    # the last interval is only as long as the rest of the run
+    first, last = report["intervals"][0], report["intervals"][-1]
+    assert first["start"] == 0 and last["start"] == 1
+    assert last["throughput"] > (last["requests"] - last["errors"]) / 1.0
+
+
+def test_loadtest_closed_loop(mock_server):
+    server = mock_server(latency=0.02)
+
+    report = tableau_loadtest.run_loadtest(server, [{"view": "Sales"}], concurrency=2, duration=0.5, report_interval=1)
+
+    assert report["errors"] == 0
+    assert 10 <= report["requests"] <= 60
+    with pytest.raises(TypeError):
+        tableau_loadtest.run_loadtest(server, [{"view": "Sales"}], rps=1, concurrency=1)
+    with pytest.raises(ValueError):
+        tableau_loadtest.run_loadtest(server, [{"view": "Sales"}], rps=0)
+    with pytest.raises(ValueError):
+        tableau_loadtest.run_loadtest(server, [{"view": "Sales"}], concurrency=0)
+
+
+def test_loadtest_keeps_a_connection_per_render_thread(mock_server, caplog):
+    server = mock_server(latency=0.02)
+
+    with caplog.at_level(logging.WARNING, logger="urllib3.connectionpool"):
+        report = tableau_loadtest.run_loadtest(server, [{"view": "Sales"}], concurrency=30, duration=0.5)
+
+    assert report["errors"] == 0
+    assert not [record for record in caplog.records if "Connection pool is full" in record.getMessage()]
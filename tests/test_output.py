@@ -0,0 +1,147 @@
+import argparse
+import csv
+import io
+import json
+import types
+import zipfile
+
+import pytest
+
+import tableau_wrapper
+
+
+class FakeServer(object):
+    """Publishes and refreshes into lists, knows only the project 'Finance', its workbook 'Revenue' and view 'Sales'"""
+
+    def __init__(self):
+        self.published = []
+        self.refreshed = []
+        self.projects = types.SimpleNamespace(get=lambda req_options: self.get(req_options, "Finance",
+                types.SimpleNamespace(id="project-finance", name="Finance", parent_id=None)))
+        self.workbooks = types.SimpleNamespace(publish=lambda item, path, mode, as_job: self.publish(item, path, mode, "wb-1"),
+                get=lambda req_options: self.get(req_options, "Revenue",
+                        types.SimpleNamespace(id="wb-1", name="Revenue", project_name="Finance")),
+                refresh=self.refreshed.append)
+        self.datasources = types.SimpleNamespace(publish=lambda item, path, mode: self.publish(item, path, mode, "ds-1"))
+        self.views = types.SimpleNamespace(get=lambda req_options: self.get(req_options, "Sales",
+                types.SimpleNamespace(id="view-1", name="Sales")), populate_image=self.populate_image)
+
+    def get(self, req_options, name, item):
+        names = [name_filter.value for name_filter in req_options.filter]
+        return ([item] if names == [name] else [], None)
+
+    def populate_image(self, view, req_options):
+        view.image = b"jpeg"
+
+    def publish(self, item, path, mode, resource_id):
+        with zipfile.ZipFile(path) as archive:
+            self.published.append((item, path, mode, archive.namelist()))
+        return (types.SimpleNamespace(id=resource_id))
+
+
+def test_write_records_ndjson():
+    output = io.StringIO()
+    records = [{"id": "a", "tags": ["x", "y"]}, types.SimpleNamespace(id="b", tags=[], extra="ignored")]
+
+    tableau_wrapper.write_records(records, "ndjson", output=output)
+
+    assert [json.loads(line) for line in output.getvalue().splitlines()] == [
+            {"id": "a", "tags": ["x", "y"]}, {"id": "b", "tags": []}]
+
+
+def test_write_records_csv():
+    output = io.StringIO()
+    records = [{"id": "a", "dropped": ["Image/a.png", "Data/b.hyper"], "size": None, "meta": {"k": 1}},
+            {"id": "b", "dropped": [], "size": 3, "meta": None}]
+
+    tableau_wrapper.write_records(iter(records), "csv", output=output)
+
+    assert list(csv.reader(io.StringIO(output.getvalue()))) == [
+            ["id", "dropped", "size", "meta"],
+            ["a", "Image/a.png;Data/b.hyper", "", '{"k": 1}'],
+            ["b", "", "3", ""]]
+
+
+def test_write_records_rejects_unknown_format():
+    with pytest.raises(NameError, match="Invalid output_format 'xml'"):
+        tableau_wrapper.write_records([], "xml")
+
+
+def test_slim_publish_writes_one_csv_record(tmp_path, capsys):
+    path = str(tmp_path / "report.twbx")
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("report.twb", "<workbook/>")
+        archive.writestr("Image/unused.png", b"unused")
+    server = FakeServer()
+    args = argparse.Namespace(publish=path, object_type="workbook", project_name="Finance", watermark_column=None,
+            slim=True, compress_level=6, output="csv")
+
+    tableau_wrapper.publish_cli(server, args)
+
+    rows = list(csv.reader(io.StringIO(capsys.readouterr().out)))
+    assert rows[0] == ["original_size", "packaged_size", "saved", "dropped", "resource_id"]
+    assert len(rows) == 2 and rows[1][3:] == ["Image/unused.png", "wb-1"]
+    # the slimmed copy got published under the original file name
+    (item, published_path, mode, members), = server.published
+    assert (item.project_id, mode, members) == ("project-finance", "CreateNew", ["report.twb"])
+    assert published_path.endswith("report.twbx") and published_path != path
+
+
+def test_publish_with_server(tmp_path):
+    path = str(tmp_path / "sales.tdsx")
+    with zipfile.ZipFile(path, "w") as archive:
+        archive.writestr("sales.tds", "<datasource/>")
+    server = FakeServer()
+
+    assert tableau_wrapper.publish("datasource", "Finance", path, "Overwrite", server=server) == "ds-1"
+    assert [(type(item).__name__, mode) for item, _, mode, _ in server.published] == [("DatasourceItem", "Overwrite")]
+
+
+def test_prompts_go_to_stderr_with_output(monkeypatch, capsys):
+    monkeypatch.setattr("builtins.input", lambda prompt="": prompt + "answer")
+
+    assert tableau_wrapper.prompt_input(argparse.Namespace(output="ndjson"), "Server: ") == "answer"
+    assert capsys.readouterr() == ("", "Server: ")
+    assert tableau_wrapper.prompt_input(argparse.Namespace(output=None), "Server: ") == "Server: answer"
+
+
+def test_refresh_writes_one_record(capsys):
+    server = FakeServer()
+    args = argparse.Namespace(object_type="workbook", object_name="Revenue", project_name="Finance",
+            enqueue=False, downstream=False, output="ndjson")
+
+    tableau_wrapper.refresh_cli(server, args)
+
+    assert json.loads(capsys.readouterr().out) == {"resource_id": "wb-1", "status": "refreshing"}
+    assert server.refreshed == ["wb-1"]
+
+
+def test_download_view_writes_one_record(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    args = argparse.Namespace(object_type="view", object_name="Sales", project_name=None, output="ndjson")
+
+    tableau_wrapper.download_cli(FakeServer(), args)
+
+    assert json.loads(capsys.readouterr().out) == {"resource_id": "view-1", "path": str(tmp_path / "Sales.jpeg")}
+    assert (tmp_path / "Sales.jpeg").read_bytes() == b"jpeg"
+
+
+def test_resolve_fields(capsys):
+    args = argparse.Namespace(object_type="workbook", object_name="Revenue", project_name="Finance",
+            fields=" id, name ", output="ndjson")
+
+    tableau_wrapper.resolve_cli(FakeServer(), args)
+    args.object_type, args.object_name, args.fields = "project", "Finance", None
+    tableau_wrapper.resolve_cli(FakeServer(), args)
+
+    assert [json.loads(line) for line in capsys.readouterr().out.splitlines()] == [
+            {"id": "wb-1", "name": "Revenue"}, {"id": "project-finance", "name": "Finance"}]
+
+
+def test_resolve_rejects_unknown_fields(capsys):
+    args = argparse.Namespace(object_type="workbook", object_name="Revenue", project_name="Finance",
+            fields="id,nmae", output="ndjson")
+
+    with pytest.raises(NameError, match="Invalid field\\(s\\) 'nmae'"):
+        tableau_wrapper.resolve_cli(FakeServer(), args)
+    assert capsys.readouterr().out == ""
@@ -0,0 +1,152 @@
+import fcntl
+import types
+
+import pytest
+
+import tableau_wrapper
+
+
+class FakeServer(object):
+    """Refreshes finish on the second check, active_jobs more refresh jobs run on the server"""
+
+    def __init__(self, queue_path, active_jobs=0):
+        self.queue_path = queue_path
+        self.active_jobs = active_jobs
+        self.started = []
+        self.checks = {}
+        self.fail_starts = 0
+        self.lock_free_during_requests = True
+        self.workbooks = self.datasources = self
+        self.jobs = types.SimpleNamespace(get_by_id=self.get_by_id, get=self.get_jobs)
+
+    def assert_queue_unlocked(self):
+        with open(self.queue_path + ".lock", "w") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            except BlockingIOError:
+                self.lock_free_during_requests = False
+
+    def refresh(self, resource_id):
+        self.assert_queue_unlocked()
+        if self.fail_starts:
+            self.fail_starts -= 1
+            raise ConnectionError("temporary failure")
+        self.started.append(resource_id)
+        return (types.SimpleNamespace(id="job-" + resource_id))
+
+    def get_by_id(self, job_id):
+        self.assert_queue_unlocked()
+        self.checks[job_id] = self.checks.get(job_id, 0) + 1
+        completed = self.checks[job_id] > 1
+        return (types.SimpleNamespace(completed_at="done" if completed else None, finish_code=0))
+
+    def get_jobs(self, req_options):
+        self.assert_queue_unlocked()
+        in_progress = any(job_filter.value == "InProgress" for job_filter in req_options.filter)
+        return ([], types.SimpleNamespace(total_available=self.active_jobs if in_progress else 0))
+
+
+class StopScheduler(Exception):
+    pass
+
+
+def stop_scheduler(seconds):
+    raise StopScheduler
+
+
+def queue_path(tmp_path):
+    return (str(tmp_path / "queue.json"))
+
+
+def test_enqueue_coalesces_duplicates_and_keeps_higher_priority(tmp_path):
+    path = queue_path(tmp_path)
+    assert tableau_wrapper.enqueue_refresh("workbook", "wb-1", 5, path)
+    assert not tableau_wrapper.enqueue_refresh("workbook", "wb-1", 1, path)
+    assert tableau_wrapper.enqueue_refresh("datasource", "ds-1", 3, path)
+    queued = tableau_wrapper.load_refresh_queue(path)["queued"]
+    assert sorted((entry[0], entry[3]) for entry in queued) == [(1, "wb-1"), (3, "ds-1")]
+
+
+def test_enqueue_coalesces_with_running_refresh(tmp_path):
+    path = queue_path(tmp_path)
+    queue = {"queued": [], "running": {"wb-1": {"resource_type": "workbook", "job_id": "job-wb-1", "priority": 5, "retries": 0}}}
+    tableau_wrapper.save_refresh_queue(queue, path)
+    assert not tableau_wrapper.enqueue_refresh("workbook", "wb-1", 1, path)
+
+
+def test_scheduler_runs_by_priority_within_budget(tmp_path):
+    path = queue_path(tmp_path)
+    server = FakeServer(path)
+    for priority, resource_id in ((5, "wb-low"), (1, "wb-high"), (3, "wb-mid")):
+        tableau_wrapper.enqueue_refresh("workbook", resource_id, priority, path)
+    results = tableau_wrapper.run_refresh_scheduler(server, max_jobs=1, queue_path=path, poll_interval=0)
+    assert server.started == ["wb-high", "wb-mid", "wb-low"]
+    assert results == {"wb-high": "refreshed", "wb-mid": "refreshed", "wb-low": "refreshed"}
+    assert server.lock_free_during_requests
+
+
+def test_scheduler_counts_refresh_jobs_of_others(tmp_path, monkeypatch):
+    path = queue_path(tmp_path)
+    server = FakeServer(path, active_jobs=2)
+    tableau_wrapper.enqueue_refresh("workbook", "wb-1", 5, path)
+    monkeypatch.setattr(tableau_wrapper.time, "sleep", stop_scheduler)
+    with pytest.raises(StopScheduler):
+        tableau_wrapper.run_refresh_scheduler(server, max_jobs=2, queue_path=path, poll_interval=0)
+    assert server.started == []
+    assert [entry[3] for entry in tableau_wrapper.load_refresh_queue(path)["queued"]] == ["wb-1"]
+
+
+def test_scheduler_marks_unknown_job_failed(tmp_path):
+    path = queue_path(tmp_path)
+    server = FakeServer(path)
+    def purged(job_id):
+        raise LookupError("job not found")
+    server.jobs.get_by_id = purged
+    queue = {"queued": [], "running": {"wb-1": {"resource_type": "workbook", "job_id": "job-purged", "priority": 5, "retries": 0}}}
+    tableau_wrapper.save_refresh_queue(queue, path)
+    assert tableau_wrapper.run_refresh_scheduler(server, queue_path=path, poll_interval=0) == {"wb-1": "failed"}
+    assert tableau_wrapper.load_refresh_queue(path)["running"] == {}
+
+
+def test_scheduler_retries_refresh_that_failed_to_start(tmp_path):
+    path = queue_path(tmp_path)
+    server = FakeServer(path)
+    server.fail_starts = 2
+    tableau_wrapper.enqueue_refresh("workbook", "wb-1", 5, path)
+    assert tableau_wrapper.run_refresh_scheduler(server, queue_path=path, poll_interval=0) == {"wb-1": "refreshed"}
+    assert server.started == ["wb-1"]
+
+
+def test_scheduler_gives_up_after_max_retries(tmp_path):
+    path = queue_path(tmp_path)
+    server = FakeServer(path)
+    server.fail_starts = 10
+    tableau_wrapper.enqueue_refresh("workbook", "wb-1", 5, path)
+    results = tableau_wrapper.run_refresh_scheduler(server, queue_path=path, poll_interval=0, max_retries=2)
+    assert results == {"wb-1": "failed"}
+    assert server.fail_starts == 7
+
+
+def test_scheduler_requeues_refresh_left_unstarted_by_a_crash(tmp_path):
+    path = queue_path(tmp_path)
+    server = FakeServer(path)
+    queue = {"queued": [], "running": {"wb-1": {"resource_type": "workbook", "job_id": None, "priority": 5, "retries": 0}}}
+    tableau_wrapper.save_refresh_queue(queue, path)
+    assert tableau_wrapper.run_refresh_scheduler(server, queue_path=path, poll_interval=0) == {"wb-1": "refreshed"}
+
+
+def test_second_scheduler_leaves_the_queue_alone(tmp_path):
+    path = queue_path(tmp_path)
+    first, second = FakeServer(path), FakeServer(path)
+    second_results = []
+    refresh = first.refresh
+    def refresh_while_second_scheduler_runs(resource_id):
+        # the entry is in 'running' without a job ID while the first scheduler starts it
+        second_results.append(tableau_wrapper.run_refresh_scheduler(second, queue_path=path, poll_interval=0))
+        return (refresh(resource_id))
+    first.workbooks = types.SimpleNamespace(refresh=refresh_while_second_scheduler_runs)
+    tableau_wrapper.enqueue_refresh("workbook", "wb-1", 5, path)
+    assert tableau_wrapper.run_refresh_scheduler(first, queue_path=path, poll_interval=0) == {"wb-1": "refreshed"}
+    assert second_results == [None]
+    assert first.started == ["wb-1"] and second.started == []
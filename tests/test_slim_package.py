@@ -0,0 +1,75 @@
+import os
+import zipfile
+
+import tableau_wrapper
+
+
+DOCUMENT = b"""<?xml version='1.0' encoding='utf-8' ?>
+<workbook>
+  <datasources>
+    <datasource name='sales'>
+      <connection class='hyper' dbname='Data/Extracts/sales &amp; returns.hyper' />
+      <connection class='ogrdirect' filename='Data/geo/regions.shp' />
+    </datasource>
+  </datasources>
+  <thumbnails><thumbnail name='Image/logo.png' /></thumbnails>
+</workbook>
+"""
+
+MEMBERS = {
+    "Data/Extracts/sales & returns.hyper": os.urandom(2048),
+    "Data/Extracts/old.hyper": b"old extract",
+    "Data/geo/regions.shp": b"shapes" * 100,
+    "Data/geo/regions.dbf": b"attributes" * 100,
+    "Data/geo/regions.shx": b"index",
+    "Data/geo/regions.prj": b"GEOGCS[\"WGS 84\"]",
+    "Image/logo.png": b"logo",
+    "Image/unused.png": b"unused",
+}
+
+
+def write_package(tmp_path):
+    path = str(tmp_path / "report.twbx")
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as archive:
+        archive.writestr("report.twb", DOCUMENT)
+        for name, data in MEMBERS.items():
+            archive.writestr(name, data)
+    return (path)
+
+
+def read_package(path):
+    with zipfile.ZipFile(path) as archive:
+        assert archive.testzip() is None
+        return ({name: archive.read(name) for name in archive.namelist()})
+
+
+def test_slim_package_drops_only_unreferenced_standalone_files(tmp_path):
+    path = write_package(tmp_path)
+
+    assert sorted(tableau_wrapper.find_unreferenced_members(path)) == ["Data/Extracts/old.hyper", "Image/unused.png"]
+    report = tableau_wrapper.slim_package(path, str(tmp_path / "slim.twbx"), max_workers=2)
+
+    assert sorted(report["dropped"]) == ["Data/Extracts/old.hyper", "Image/unused.png"]
+    members = read_package(str(tmp_path / "slim.twbx"))
+    # the shapefile sidecars are never named in the document but are kept
+    assert members == dict({"report.twb": DOCUMENT}, **{name: data for name, data in MEMBERS.items()
+            if name not in report["dropped"]})
+    assert report["packaged_size"] == os.path.getsize(str(tmp_path / "slim.twbx"))
+
+
+def test_slim_package_writes_zip64_records(tmp_path, monkeypatch):
+    path = write_package(tmp_path)
+    # every size and offset past the first bytes takes the zip64 branches
+    monkeypatch.setattr(tableau_wrapper, "ZIP64_LIMIT", 64)
+
+    tableau_wrapper.slim_package(path, str(tmp_path / "slim.twbx"))
+
+    with open(str(tmp_path / "slim.twbx"), "rb") as slim_file:
+        data = slim_file.read()
+    assert b"PK\x06\x06" in data and b"PK\x06\x07" in data
+    members = read_package(str(tmp_path / "slim.twbx"))
+    assert members["Data/Extracts/sales & returns.hyper"] == MEMBERS["Data/Extracts/sales & returns.hyper"]
+    assert members["Data/geo/regions.dbf"] == MEMBERS["Data/geo/regions.dbf"]
+    with zipfile.ZipFile(str(tmp_path / "slim.twbx")) as archive:
+        assert all(info.header_offset < len(data) for info in archive.infolist())
+        assert archive.getinfo("Data/geo/regions.shp").file_size == len(MEMBERS["Data/geo/regions.shp"])